@@ -3,7 +3,7 @@ import logging
 
 import hail as hl
 
-from hail_scripts.reference_data.combine import join_hts
+from hail_scripts.reference_data.combine import flatten_interval_ht, join_hts
 
 VERSION = '2.0.5'
 OUTPUT_PATH = "gs://seqr-reference-data/GRCh38/combined_interval_reference_data/combined_interval_reference_data.ht"
@@ -22,6 +22,12 @@ def run(args):
     output_path = args.output_path if args.output_path else OUTPUT_PATH
     logger.info("Writing to %s", output_path)
     joined_ht.write(output_path, overwrite=args.force_write)
+
+    # Non-overlapping segments of the intervals, so each variant looks up a single segment when loading
+    segments_output_path = output_path.replace(".ht", "_segments.ht")
+    logger.info("Writing the segment index to %s", segments_output_path)
+    segments_ht = flatten_interval_ht(hl.read_table(output_path))
+    segments_ht.write(segments_output_path, overwrite=args.force_write)
     logger.info("Done")
 
 
@@ -4,6 +4,7 @@ import logging
 import hail as hl
 from hail_scripts.computed_fields.vep import get_expr_for_vep_sorted_transcript_consequences_array, \
     get_expr_for_worst_transcript_consequence_annotations_struct, CONSEQUENCE_TERM_RANK_LOOKUP
+from hail_scripts.utils.encoded_variants import encoded_variants_path, write_encoded_variants
 
 VALIDATION_KEYTABLE_PATHS = {
     'coding_37': 'gs://seqr-reference-data/GRCh37/validate_ht/common_coding_variants.grch37.ht',
@@ -48,6 +49,11 @@ def write_out_ht(ht, output_path):
     print(ht.count())
     ht.write(output_path, overwrite=True)
 
+    # Sorted array of encoded variants, used by the loading pipeline validation instead of reading the table
+    encoded_path = encoded_variants_path(output_path)
+    n_encoded = write_encoded_variants(hl.read_table(output_path), encoded_path)
+    logger.info("==> Wrote {} encoded variants to {}".format(n_encoded, encoded_path))
+
 
 ht = read_gnomad_subset(args.genome_version)
 ht.persist()
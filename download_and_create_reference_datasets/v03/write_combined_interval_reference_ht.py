@@ -7,7 +7,11 @@ import uuid
 
 import hail as hl
 
-from hail_scripts.reference_data.combine import join_hts, update_existing_joined_hts
+from hail_scripts.reference_data.combine import (
+    flatten_interval_ht,
+    join_hts,
+    update_existing_joined_hts,
+)
 from hail_scripts.reference_data.config import GCS_PREFIXES, AccessControl
 from hail_scripts.utils.hail_utils import write_ht
 
@@ -42,6 +46,14 @@ def run(environment: str, dataset: str | None):
     print(f'Uploading ht to {destination_path}')
     write_ht(ht, destination_path)
 
+    # Non-overlapping segments of the intervals, so each variant looks up a single segment when loading
+    segments_destination_path = destination_path[: -len('.ht')] + '_segments.ht'
+    print(f'Uploading the segment index to {segments_destination_path}')
+    write_ht(
+        flatten_interval_ht(hl.read_table(destination_path)),
+        segments_destination_path,
+    )
+
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import os
+import uuid
+
+import hail as hl
+
+from hail_scripts.reference_data.config import (
+    COMBINED_REFERENCE_HT_PATH,
+    GCS_PREFIXES,
+    AccessControl,
+)
+from hail_scripts.utils.hail_utils import run_vep, write_ht
+from hail_scripts.utils.vep_cache import post_process_vep, vep_cache_info, vep_cache_key
+
+# VEP results of the gnomAD sites of the combined reference table, in the format of the VEP cache (see
+# luigi_pipeline/lib/vep_cache.py). SeqrVCFToMTTask reads it with reference_vep_ht_path, and only runs VEP on
+# the variants missing from it.
+REFERENCE_VEP_HT_PATH = 'reference_datasets/reference_vep.ht'
+GNOMAD_DATASETS = ['gnomad_genomes', 'gnomad_exomes']
+
+
+def run(
+    environment: str,
+    genome_version: str,
+    vep_config_json_path: str | None,
+    vep_version: str | None,
+):
+    reference_ht_path, destination_path = (
+        os.path.join(GCS_PREFIXES[(environment, AccessControl.PUBLIC)], path).format(
+            genome_version=genome_version,
+        )
+        for path in [COMBINED_REFERENCE_HT_PATH, REFERENCE_VEP_HT_PATH]
+    )
+    ht = hl.read_table(reference_ht_path)
+    ht = ht.filter(hl.any([hl.is_defined(ht[dataset]) for dataset in GNOMAD_DATASETS]))
+    ht = ht.select().select_globals()
+    ht = run_vep(ht, genome_version, vep_config_json_path=vep_config_json_path)
+    # Keyed like the VEP cache, so loads with a different VEP config or VEP version ignore the table
+    ht = ht.select('vep').select_globals(
+        cache_key=vep_cache_key(genome_version, vep_config_json_path, vep_version),
+        vep_cache_info=hl.struct(
+            **vep_cache_info(genome_version, vep_config_json_path, vep_version),
+        ),
+    )
+    ht = post_process_vep(ht)
+    ht.describe()
+    checkpoint_path = f"{GCS_PREFIXES[('dev', AccessControl.PUBLIC)]}/{uuid.uuid4()}.ht"
+    print(f'Checkpointing ht to {checkpoint_path}')
+    ht = ht.checkpoint(checkpoint_path, stage_locally=True)
+    print(f'Uploading ht to {destination_path}')
+    write_ht(ht, destination_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--environment',
+        default='dev',
+        choices=['dev', 'prod'],
+    )
+    parser.add_argument(
+        '--genome-version',
+        help='Reference build, 37 or 38',
+        choices=['37', '38'],
+        default='38',
+    )
+    parser.add_argument(
+        '--vep-config-json-path',
+        default=None,
+        help='Hail VEP config, the same as the loading pipeline. Defaults to the config of the VEP dataproc cluster.',
+    )
+    parser.add_argument(
+        '--vep-version',
+        default=None,
+        help='VEP release of the config, e.g. 95, the same as the loading pipeline. Defaults to the release of the VEP dataproc cluster for the default config.',
+    )
+    args, _ = parser.parse_known_args()
+    run(
+        args.environment,
+        args.genome_version,
+        args.vep_config_json_path,
+        args.vep_version,
+    )
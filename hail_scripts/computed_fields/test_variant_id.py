@@ -2,7 +2,7 @@ import unittest
 
 import hail as hl
 
-from .variant_id import get_expr_for_xpos
+from .variant_id import get_expr_for_allele_code, get_expr_for_xpos
 
 
 class TestXpos(unittest.TestCase):
@@ -19,5 +19,19 @@ class TestXpos(unittest.TestCase):
         self.assertEqual(hl.eval(get_expr_for_xpos(locus)), 2166847734)
 
 
+class TestAlleleCode(unittest.TestCase):
+    def test_snv(self):
+        self.assertEqual(hl.eval(get_expr_for_allele_code(hl.literal(["A", "G"]))), 2)
+        self.assertEqual(hl.eval(get_expr_for_allele_code(hl.literal(["T", "C"]))), 13)
+
+    def test_non_snv(self):
+        # The hash is fixed, encoded variants written by another hail version must keep matching
+        self.assertEqual(hl.eval(get_expr_for_allele_code(hl.literal(["A", "AT"]))), 16 + 83_184_270)
+        self.assertNotEqual(
+            hl.eval(get_expr_for_allele_code(hl.literal(["A", "ACG"]))),
+            hl.eval(get_expr_for_allele_code(hl.literal(["A", "ATT"]))),
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,5 @@
+import string
+
 import hail as hl
 
 
@@ -89,3 +91,45 @@ def get_expr_for_xpos(locus: hl.expr.LocusExpression) -> hl.expr.Int64Expression
     """
     contig_number = get_expr_for_contig_number(locus)
     return hl.int64(contig_number) * 1_000_000_000 + locus.position
+
+
+# Allele codes of get_expr_for_allele_code are in [0, ALLELE_CODE_RANGE), so that xpos * ALLELE_CODE_RANGE + code fits
+# in an int64 for every contig number up to 25.
+ALLELE_CODE_RANGE = 1 << 28
+# Largest prime under ALLELE_CODE_RANGE - 16, the number of codes left for non-SNVs
+ALLELE_HASH_MODULUS = 268_435_399
+ALLELE_HASH_CHARS = string.printable
+
+
+def get_expr_for_allele_hash(alleles: hl.expr.ArrayExpression) -> hl.expr.Int64Expression:
+    """Polynomial hash of the ref and alt alleles of a split variant, in [0, ALLELE_HASH_MODULUS). Computed with hail
+    arithmetic, so it is the same on every hail version."""
+    char_codes = hl.literal({char: i + 1 for i, char in enumerate(ALLELE_HASH_CHARS)})
+
+    def add_chars(h, allele):
+        return hl.fold(
+            lambda h, i: (h * 131 + char_codes.get(allele[i], 0)) % ALLELE_HASH_MODULUS, h, hl.range(hl.len(allele))
+        )
+
+    # The 0 between the alleles is not the code of any character
+    return add_chars(add_chars(hl.int64(0), alleles[0]) * 131 % ALLELE_HASH_MODULUS, alleles[1])
+
+
+def get_expr_for_allele_code(alleles: hl.expr.ArrayExpression) -> hl.expr.Int64Expression:
+    """Code of the alleles of a split variant: 4 * ref + alt for SNVs, or 16 + get_expr_for_allele_hash for other
+    variants. SNVs at the same position never share a code, other variants only do on a hash collision, about 1 in
+    2**28 per pair.
+    """
+    bases = hl.literal({base: i for i, base in enumerate("ACGT")})
+    ref = alleles[0]
+    alt = alleles[1]
+    return hl.if_else(
+        bases.contains(ref) & bases.contains(alt),
+        hl.int64(4 * bases[ref] + bases[alt]),
+        16 + get_expr_for_allele_hash(alleles),
+    )
+
+
+def get_expr_for_encoded_variant(locus: hl.expr.LocusExpression, alleles: hl.expr.ArrayExpression) -> hl.expr.Int64Expression:
+    """Variant represented as a single number = xpos * ALLELE_CODE_RANGE + allele code, so variants sort by position."""
+    return get_expr_for_xpos(locus) * ALLELE_CODE_RANGE + get_expr_for_allele_code(alleles)
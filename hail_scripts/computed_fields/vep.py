@@ -50,6 +50,23 @@ CONSEQUENCE_TERMS = [
 CONSEQUENCE_TERM_RANK_LOOKUP = hl.dict({term: rank for rank, term in enumerate(CONSEQUENCE_TERMS)})
 
 
+def _consequence_category(rank):
+    if rank <= CONSEQUENCE_TERMS.index("frameshift_variant"):
+        return "lof"
+    if rank <= CONSEQUENCE_TERMS.index("missense_variant"):
+        return "missense"
+    if rank <= CONSEQUENCE_TERMS.index("synonymous_variant"):
+        return "synonymous"
+    return "other"
+
+
+# Enum encoding of the consequence terms: a term's id is its rank, so the major consequence of a transcript is its
+# smallest id, and the term and category of an id are indexes into these arrays.
+CONSEQUENCE_TERMS_BY_ID = hl.literal(CONSEQUENCE_TERMS)
+CONSEQUENCE_CATEGORIES_BY_ID = hl.literal([_consequence_category(rank) for rank in range(len(CONSEQUENCE_TERMS))])
+UNKNOWN_CONSEQUENCE_TERM_ID = -1
+
+
 OMIT_CONSEQUENCE_TERMS = [
     "upstream_gene_variant",
     "downstream_gene_variant",
@@ -125,23 +142,47 @@ HGVSC_CONSEQUENCES = hl.set(["splice_donor_variant", "splice_acceptor_variant",
 
 
 def get_expr_for_formatted_hgvs(csq):
-    return hl.cond(
-        hl.is_missing(csq.hgvsp) | HGVSC_CONSEQUENCES.contains(csq.major_consequence),
-        csq.hgvsc.split(":")[-1],
-        hl.cond(
+    hgvsp = csq.hgvsp.split(":")[-1]
+    # Synonymous hgvsp are rewritten from the coding annotations, when they were selected
+    if "amino_acids" in csq and "protein_start" in csq:
+        hgvsp = hl.cond(
             csq.hgvsp.contains("=") | csq.hgvsp.contains("%3D"),
             hl.bind(
                 lambda protein_letters: "p." + protein_letters + hl.str(csq.protein_start) + protein_letters,
                 hl.delimit(csq.amino_acids.split("").map(lambda l: PROTEIN_LETTERS_1TO3.get(l)), ""),
             ),
-            csq.hgvsp.split(":")[-1],
+            hgvsp,
+        )
+    return hl.cond(
+        hl.is_missing(csq.hgvsp) | HGVSC_CONSEQUENCES.contains(csq.major_consequence),
+        csq.hgvsc.split(":")[-1],
+        hgvsp,
+    )
+
+
+def get_expr_for_consequence_term_ids(consequence_terms):
+    """Enum-encodes consequence terms, with UNKNOWN_CONSEQUENCE_TERM_ID for terms missing from CONSEQUENCE_TERMS."""
+    return consequence_terms.map(lambda t: hl.or_else(CONSEQUENCE_TERM_RANK_LOOKUP.get(t), UNKNOWN_CONSEQUENCE_TERM_ID))
+
+
+def _transcript_sort_key(c, is_most_severe):
+    return hl.bind(
+        lambda is_coding, is_canonical: (
+            hl.cond(
+                is_coding,
+                hl.cond(is_most_severe, hl.cond(is_canonical, 1, 2), hl.cond(is_canonical, 3, 4)),
+                hl.cond(is_most_severe, hl.cond(is_canonical, 5, 6), hl.cond(is_canonical, 7, 8)),
+            )
         ),
+        hl.or_else(c.biotype, "") == "protein_coding",
+        hl.or_else(c.canonical, 0) == 1,
     )
 
 
 def get_expr_for_vep_sorted_transcript_consequences_array(vep_root,
                                                           include_coding_annotations=True,
-                                                          omit_consequences=OMIT_CONSEQUENCE_TERMS):
+                                                          omit_consequences=OMIT_CONSEQUENCE_TERMS,
+                                                          encode_consequences=True):
     """Sort transcripts by 3 properties:
 
         1. coding > non-coding
@@ -163,6 +204,9 @@ def get_expr_for_vep_sorted_transcript_consequences_array(vep_root,
     Args:
         vep_root (StructExpression): root path of the VEP struct in the MT
         include_coding_annotations (bool): if True, fields relevant to protein-coding variants will be included
+        encode_consequences (bool): if True, each transcript's consequence terms are looked up once and ranked,
+            categorized and compared as enum ids (see CONSEQUENCE_TERMS_BY_ID), and only the resulting strings are
+            materialized. Otherwise each of these steps looks up strings. Both give the same result.
     """
 
     selected_annotations = [
@@ -197,60 +241,93 @@ def get_expr_for_vep_sorted_transcript_consequences_array(vep_root,
 
     omit_consequence_terms = hl.set(omit_consequences) if omit_consequences else hl.empty_set(hl.tstr)
 
-    result = hl.sorted(
-        vep_root.transcript_consequences.map(
+    if encode_consequences:
+        # Omitted terms that aren't in CONSEQUENCE_TERMS have no id, they are still filtered from consequence_terms
+        omit_ids = [CONSEQUENCE_TERMS.index(t) for t in (omit_consequences or []) if t in CONSEQUENCE_TERMS]
+        omit_consequence_term_ids = hl.set(omit_ids) if omit_ids else hl.empty_set(hl.tint32)
+        transcript_consequences = vep_root.transcript_consequences.map(
+            lambda c: hl.bind(
+                lambda consequence_term_ids: hl.bind(
+                    lambda major_consequence_id: c.select(
+                        *selected_annotations,
+                        consequence_terms=c.consequence_terms.filter(lambda t: ~omit_consequence_terms.contains(t)),
+                        domains=c.domains.map(lambda domain: domain.db + ":" + domain.name),
+                        # Unknown terms sort after the known ones, and the first is the major consequence if all are
+                        major_consequence=hl.or_else(
+                            CONSEQUENCE_TERMS_BY_ID[major_consequence_id], c.consequence_terms.first()
+                        ),
+                        category=CONSEQUENCE_CATEGORIES_BY_ID[major_consequence_id],
+                        major_consequence_rank=major_consequence_id,
+                        consequence_term_ids=consequence_term_ids.filter(
+                            lambda i: ~omit_consequence_term_ids.contains(i)
+                        ),
+                    ),
+                    hl.min(consequence_term_ids.filter(lambda i: i != UNKNOWN_CONSEQUENCE_TERM_ID)),
+                ),
+                get_expr_for_consequence_term_ids(c.consequence_terms),
+            )
+        ).filter(lambda c: c.consequence_terms.size() > 0)
+        # Same field order as without encoding
+        transcript_consequences = transcript_consequences.map(
             lambda c: c.select(
                 *selected_annotations,
-                consequence_terms=c.consequence_terms.filter(lambda t: ~omit_consequence_terms.contains(t)),
-                domains=c.domains.map(lambda domain: domain.db + ":" + domain.name),
-                major_consequence=hl.cond(
-                    c.consequence_terms.size() > 0,
-                    hl.sorted(c.consequence_terms, key=lambda t: CONSEQUENCE_TERM_RANK_LOOKUP.get(t))[0],
-                    hl.null(hl.tstr),
-                )
+                "consequence_terms",
+                "domains",
+                "major_consequence",
+                "category",
+                "consequence_term_ids",
+                hgvs=get_expr_for_formatted_hgvs(c),
+                major_consequence_rank=c.major_consequence_rank,
             )
         )
-        .filter(lambda c: c.consequence_terms.size() > 0)
-        .map(
-            lambda c: c.annotate(
-                category=(
-                    hl.case()
-                    .when(
-                        CONSEQUENCE_TERM_RANK_LOOKUP.get(c.major_consequence)
-                        <= CONSEQUENCE_TERM_RANK_LOOKUP.get("frameshift_variant"),
-                        "lof",
-                    )
-                    .when(
-                        CONSEQUENCE_TERM_RANK_LOOKUP.get(c.major_consequence)
-                        <= CONSEQUENCE_TERM_RANK_LOOKUP.get("missense_variant"),
-                        "missense",
-                    )
-                    .when(
-                        CONSEQUENCE_TERM_RANK_LOOKUP.get(c.major_consequence)
-                        <= CONSEQUENCE_TERM_RANK_LOOKUP.get("synonymous_variant"),
-                        "synonymous",
-                    )
-                    .default("other")
+        most_severe_consequence_id = CONSEQUENCE_TERM_RANK_LOOKUP.get(vep_root.most_severe_consequence)
+        result = hl.sorted(
+            transcript_consequences,
+            lambda c: _transcript_sort_key(
+                c,
+                hl.if_else(
+                    hl.is_defined(most_severe_consequence_id),
+                    c.consequence_term_ids.contains(most_severe_consequence_id),
+                    c.consequence_terms.contains(vep_root.most_severe_consequence),
                 ),
-                hgvs=get_expr_for_formatted_hgvs(c),
-                major_consequence_rank=CONSEQUENCE_TERM_RANK_LOOKUP.get(c.major_consequence),
-            )
-        ),
-        lambda c: (
-            hl.bind(
-                lambda is_coding, is_most_severe, is_canonical: (
-                    hl.cond(
-                        is_coding,
-                        hl.cond(is_most_severe, hl.cond(is_canonical, 1, 2), hl.cond(is_canonical, 3, 4)),
-                        hl.cond(is_most_severe, hl.cond(is_canonical, 5, 6), hl.cond(is_canonical, 7, 8)),
+            ),
+        ).map(lambda c: c.drop("consequence_term_ids"))
+    else:
+        result = hl.sorted(
+            vep_root.transcript_consequences.map(
+                lambda c: c.select(
+                    *selected_annotations,
+                    consequence_terms=c.consequence_terms.filter(lambda t: ~omit_consequence_terms.contains(t)),
+                    domains=c.domains.map(lambda domain: domain.db + ":" + domain.name),
+                    major_consequence=hl.cond(
+                        c.consequence_terms.size() > 0,
+                        hl.sorted(c.consequence_terms, key=lambda t: CONSEQUENCE_TERM_RANK_LOOKUP.get(t))[0],
+                        hl.null(hl.tstr),
                     )
-                ),
-                hl.or_else(c.biotype, "") == "protein_coding",
-                hl.set(c.consequence_terms).contains(vep_root.most_severe_consequence),
-                hl.or_else(c.canonical, 0) == 1,
+                )
             )
-        ),
-    )
+            .filter(lambda c: c.consequence_terms.size() > 0)
+            .map(
+                # Look up the rank once per transcript, and compare it to the category thresholds as ints
+                lambda c: hl.bind(
+                    lambda major_consequence_rank: c.annotate(
+                        category=(
+                            hl.case()
+                            .when(major_consequence_rank <= CONSEQUENCE_TERMS.index("frameshift_variant"), "lof")
+                            .when(major_consequence_rank <= CONSEQUENCE_TERMS.index("missense_variant"), "missense")
+                            .when(major_consequence_rank <= CONSEQUENCE_TERMS.index("synonymous_variant"), "synonymous")
+                            .default("other")
+                        ),
+                        hgvs=get_expr_for_formatted_hgvs(c),
+                        major_consequence_rank=major_consequence_rank,
+                    ),
+                    CONSEQUENCE_TERM_RANK_LOOKUP.get(c.major_consequence),
+                )
+            ),
+            lambda c: _transcript_sort_key(
+                c, hl.set(c.consequence_terms).contains(vep_root.most_severe_consequence)
+            ),
+        )
 
     if not include_coding_annotations:
         # for non-coding variants, drop fields here that are hard to exclude in the above code
@@ -353,3 +430,33 @@ def get_expr_for_worst_transcript_consequence_annotations_struct(
             vep_sorted_transcript_consequences_root[0],
         ),
     )
+
+
+# Row field storing get_expr_for_vep_post_processed_struct next to the vep field.
+VEP_POST_PROCESSED_FIELD = "vep_post_processed"
+# Bump when the output of get_expr_for_vep_post_processed_struct changes, to invalidate stored results.
+VEP_POST_PROCESSING_VERSION = "1"
+
+
+def get_expr_for_vep_post_processed_struct(vep_root):
+    """Computes the sorted transcript consequences and every annotation derived from them at once, so they
+    can be stored with the VEP results (e.g. in a VEP cache) instead of being re-derived on every load.
+
+    Args:
+        vep_root (StructExpression): root path of the VEP struct in the MT
+    Return:
+        StructExpression: sortedTranscriptConsequences, domains, transcriptConsequenceTerms, transcriptIds,
+            mainTranscript, geneIds and codingGeneIds
+    """
+    return hl.bind(
+        lambda sorted_transcript_consequences: hl.struct(
+            sortedTranscriptConsequences=sorted_transcript_consequences,
+            domains=get_expr_for_vep_protein_domains_set_from_sorted(sorted_transcript_consequences),
+            transcriptConsequenceTerms=get_expr_for_vep_consequence_terms_set(sorted_transcript_consequences),
+            transcriptIds=get_expr_for_vep_transcript_ids_set(sorted_transcript_consequences),
+            mainTranscript=get_expr_for_worst_transcript_consequence_annotations_struct(sorted_transcript_consequences),
+            geneIds=get_expr_for_vep_gene_ids_set(sorted_transcript_consequences),
+            codingGeneIds=get_expr_for_vep_gene_ids_set(sorted_transcript_consequences, only_coding_genes=True),
+        ),
+        get_expr_for_vep_sorted_transcript_consequences_array(vep_root),
+    )
@@ -0,0 +1,537 @@
+import functools
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+import hail as hl
+import urllib3
+
+from hail_scripts.elasticsearch.elasticsearch_utils import (
+    ELASTICSEARCH_INDEX,
+    ELASTICSEARCH_UPDATE,
+    ELASTICSEARCH_UPSERT,
+    ELASTICSEARCH_WRITE_OPERATIONS,
+)
+
+
+logger = logging.getLogger()
+
+TOO_MANY_REQUESTS = 429
+
+
+class ElasticsearchBulkExportError(Exception):
+    pass
+
+
+def to_json_value(value, write_null_values=True):
+    """Converts a value collected from a hail Table to something json.dumps can serialize the way elasticsearch expects."""
+    if isinstance(value, Mapping):
+        return {
+            k: to_json_value(v, write_null_values) for k, v in value.items() if write_null_values or v is not None
+        }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_json_value(v, write_null_values) for v in value]
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if isinstance(value, (hl.genetics.Locus, hl.genetics.Call, hl.utils.Interval)):
+        return str(value)
+    return value
+
+
+def _without_non_finite_floats(expr):
+    """Replaces NaN and infinite floats nested in expr with missing values, which elasticsearch doesn't accept."""
+    dtype = expr.dtype
+    if dtype in (hl.tfloat32, hl.tfloat64):
+        return hl.or_missing(hl.is_finite(expr), expr)
+    if not any(t in (hl.tfloat32, hl.tfloat64) for t in _nested_types(dtype)):
+        return expr
+    if isinstance(dtype, hl.tstruct):
+        fields = {field: _without_non_finite_floats(expr[field]) for field in dtype}
+        return hl.or_missing(hl.is_defined(expr), hl.struct(**fields))
+    if isinstance(dtype, (hl.tarray, hl.tset)):
+        return expr.map(_without_non_finite_floats)
+    return expr
+
+
+def _nested_types(dtype):
+    yield dtype
+    if isinstance(dtype, hl.tstruct):
+        for field_type in dtype.types:
+            yield from _nested_types(field_type)
+    elif isinstance(dtype, (hl.tarray, hl.tset)):
+        yield from _nested_types(dtype.element_type)
+
+
+# Exporter of the current export in each Spark python worker, reused by the tasks of all its partitions so they share
+# a connection pool and the state of the AimdBulkController.
+_executor_exporters = {}
+
+
+def _export_lines(exporter, export_id, lines):
+    """Sends the NDJSON documents of a Spark task, on the executor. Returns the stats of its requests, and the
+    operating point of the worker's AimdBulkController once they are sent."""
+    if export_id not in _executor_exporters:
+        _executor_exporters.clear()
+        _executor_exporters[export_id] = exporter
+    exporter = _executor_exporters[export_id]
+    stats_before = dict(exporter.stats)
+    exporter.export_docs(json.loads(line) for line in lines)
+    stats = {key: value - stats_before[key] for key, value in exporter.stats.items()}
+    return [(stats, exporter._controller.operating_point() if exporter._controller else None)]
+
+
+class AimdBulkController:
+    """Tunes the _bulk batch size and number of in-flight requests with additive increase/multiplicative decrease.
+
+    Every accepted request whose latency is under `target_latency_seconds` grows the batch size by
+    `batch_size_increase_bytes`, and every `max_in_flight_requests` such requests in a row add one in-flight request.
+    A slow request shrinks the batch size by `decrease_factor`. A rejection (a 429 or es_rejected_execution_exception)
+    shrinks both, once per congestion event: rejections of requests sent before the last decrease are ignored.
+    """
+
+    def __init__(
+        self,
+        batch_size_bytes=1024 * 1024,
+        max_in_flight_requests=2,
+        min_batch_size_bytes=64 * 1024,
+        max_batch_size_bytes=50 * 1024 * 1024,
+        max_in_flight_requests_limit=16,
+        batch_size_increase_bytes=512 * 1024,
+        target_latency_seconds=5,
+        decrease_factor=0.5,
+    ):
+        self.batch_size_bytes = batch_size_bytes
+        self.max_in_flight_requests = max_in_flight_requests
+        self.min_batch_size_bytes = min_batch_size_bytes
+        self.max_batch_size_bytes = max_batch_size_bytes
+        self.max_in_flight_requests_limit = max_in_flight_requests_limit
+        self.batch_size_increase_bytes = batch_size_increase_bytes
+        self.target_latency_seconds = target_latency_seconds
+        self.decrease_factor = decrease_factor
+
+        self.generation = 0
+        self._fast_requests = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def operating_point(self):
+        return {"batch_size_bytes": self.batch_size_bytes, "max_in_flight_requests": self.max_in_flight_requests}
+
+    def on_accepted(self, latency_seconds):
+        with self._lock:
+            if latency_seconds > self.target_latency_seconds:
+                self._fast_requests = 0
+                self.batch_size_bytes = max(self.min_batch_size_bytes, int(self.batch_size_bytes * self.decrease_factor))
+                return
+
+            self.batch_size_bytes = min(self.max_batch_size_bytes, self.batch_size_bytes + self.batch_size_increase_bytes)
+            self._fast_requests += 1
+            if self._fast_requests >= self.max_in_flight_requests:
+                self._fast_requests = 0
+                self.max_in_flight_requests = min(self.max_in_flight_requests_limit, self.max_in_flight_requests + 1)
+
+    def on_rejected(self, generation):
+        """
+        Args:
+            generation (int): the value of `generation` when the rejected request was sent
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self.generation += 1
+            self._fast_requests = 0
+            self.batch_size_bytes = max(self.min_batch_size_bytes, int(self.batch_size_bytes * self.decrease_factor))
+            self.max_in_flight_requests = max(1, int(self.max_in_flight_requests * self.decrease_factor))
+            logger.info(f"==> _bulk rejection, decreasing to {self.operating_point()}")
+
+
+class PartitionExportProgress:
+    """Per-partition markers of an export, so an interrupted export can resume from the partitions not yet acknowledged.
+
+    Markers are files in `path`, along with the number of partitions of the exported table. Markers written for a
+    table with a different number of partitions are discarded, since partition indices wouldn't match.
+    """
+
+    def __init__(self, path):
+        self._path = path.rstrip("/")
+
+    def clear(self):
+        if hl.hadoop_exists(self._path):
+            hl.current_backend().fs.rmtree(self._path)
+
+    def completed_partitions(self, n_partitions):
+        n_partitions_path = f"{self._path}/n_partitions"
+        if hl.hadoop_exists(n_partitions_path):
+            with hl.hadoop_open(n_partitions_path, "r") as f:
+                if int(f.read()) == n_partitions:
+                    return {
+                        int(os.path.basename(marker["path"]).split("_")[1])
+                        for marker in hl.hadoop_ls(self._path)
+                        if os.path.basename(marker["path"]).startswith("partition_")
+                    }
+            logger.info(f"==> discarding export progress in {self._path}, the table's partitioning changed")
+            self.clear()
+
+        with hl.hadoop_open(n_partitions_path, "w") as f:
+            f.write(str(n_partitions))
+        return set()
+
+    def mark_exported(self, partition):
+        with hl.hadoop_open(f"{self._path}/partition_{partition}", "w") as f:
+            f.write("")
+
+
+class ElasticsearchBulkExporter:
+    """Exports documents to an elasticsearch index through the _bulk API, without the elasticsearch-hadoop connector.
+
+    Documents are encoded as _bulk NDJSON and grouped into payloads of about `batch_size_bytes`, which are POSTed
+    over a pooled HTTP connection with up to `max_in_flight_requests` requests in flight (per partition for tables).
+    Requests rejected with a 429, either for the whole payload or for individual documents, are retried with a backoff
+    shared by all in-flight requests: it doubles on every rejection and halves on every accepted request.
+
+    If an AimdBulkController is given, it sets the batch size and number of in-flight requests instead, adapting them
+    to the observed latency and rejections. For tables, each Spark python worker adapts its own copy of it, and the
+    operating points the workers reach are logged by the driver.
+    """
+
+    def __init__(
+        self,
+        host,
+        port,
+        index_name,
+        es_username=None,
+        es_password=None,
+        batch_size_bytes=5 * 1024 * 1024,
+        max_in_flight_requests=4,
+        elasticsearch_write_operation=ELASTICSEARCH_INDEX,
+        elasticsearch_mapping_id=None,
+        write_null_values=False,
+        ignore_elasticsearch_write_errors=False,
+        max_retries=10,
+        initial_backoff_seconds=0.5,
+        max_backoff_seconds=60,
+        request_timeout_seconds=120,
+        controller=None,
+        max_concurrent_partitions=None,
+        use_took_latency=False,
+    ):
+        """Constructor.
+
+        Args:
+            host (str): Elasticsearch server host
+            port (str): Elasticsearch server port
+            index_name (str): index to export to, it must already exist
+            es_username (str): Elasticsearch username
+            es_password (str): Elasticsearch password, basic auth is only used if this is set
+            batch_size_bytes (int): approximate size of each _bulk request body
+            max_in_flight_requests (int): number of _bulk requests sent concurrently
+            elasticsearch_write_operation (str): ELASTICSEARCH_INDEX, ELASTICSEARCH_CREATE, ELASTICSEARCH_UPDATE or
+                ELASTICSEARCH_UPSERT
+            elasticsearch_mapping_id (str): if specified, the document field to use as the document _id
+            write_null_values (bool): whether to write fields that are null to the index
+            ignore_elasticsearch_write_errors (bool): log document errors instead of raising them
+            max_retries (int): number of times a rejected request or document is retried before giving up
+            initial_backoff_seconds (float): backoff after the first rejection
+            max_backoff_seconds (float): upper bound on the backoff
+            request_timeout_seconds (float): timeout of each _bulk request
+            controller (AimdBulkController): optional controller overriding batch_size_bytes and max_in_flight_requests
+            max_concurrent_partitions (int): number of partitions export_table sends at a time, defaults to the
+                default parallelism of the Spark context
+            use_took_latency (bool): report the `took` time of each _bulk response to the controller instead of the
+                request's wall-clock time, leaving out the network and the scheduling of busy executors
+        """
+        if elasticsearch_write_operation not in ELASTICSEARCH_WRITE_OPERATIONS:
+            raise ValueError("Unexpected value for elasticsearch_write_operation arg: " + str(elasticsearch_write_operation))
+
+        self._url = f"http://{host}:{port}/{index_name}/_bulk"
+        self._index_name = index_name
+        self.batch_size_bytes = batch_size_bytes
+        self.max_in_flight_requests = max_in_flight_requests
+        self._write_operation = elasticsearch_write_operation
+        self._mapping_id = elasticsearch_mapping_id
+        self._write_null_values = write_null_values
+        self._ignore_write_errors = ignore_elasticsearch_write_errors
+        self._max_retries = max_retries
+        self._initial_backoff_seconds = initial_backoff_seconds
+        self._max_backoff_seconds = max_backoff_seconds
+        self._controller = controller
+        self._use_took_latency = use_took_latency
+
+        self.max_concurrent_partitions = max_concurrent_partitions
+        self._headers = {"Content-Type": "application/x-ndjson"}
+        if es_password:
+            self._headers.update(urllib3.make_headers(basic_auth=f"{es_username}:{es_password}"))
+        self._request_timeout_seconds = request_timeout_seconds
+        self._http = self._pool_manager()
+
+        self._lock = threading.Lock()
+        self._backoff_seconds = 0
+        self.stats = {"docs": 0, "bytes": 0, "requests": 0, "rejected_requests": 0, "rejected_docs": 0, "failed_docs": 0}
+
+    def _pool_manager(self):
+        return urllib3.PoolManager(
+            maxsize=self._max_in_flight_requests_limit(),
+            block=True,
+            headers=self._headers,
+            timeout=urllib3.Timeout(total=self._request_timeout_seconds),
+            retries=urllib3.Retry(total=3, connect=3, read=0, status=0, backoff_factor=1),
+        )
+
+    def encode_doc(self, doc):
+        """Returns the _bulk NDJSON action and source lines for a document."""
+        source = to_json_value(doc, self._write_null_values)
+        metadata = {}
+        if self._mapping_id is not None:
+            metadata["_id"] = source[self._mapping_id]
+
+        if self._write_operation in (ELASTICSEARCH_UPDATE, ELASTICSEARCH_UPSERT):
+            action = {"update": metadata}
+            source = {"doc": source, "doc_as_upsert": self._write_operation == ELASTICSEARCH_UPSERT}
+        else:
+            action = {self._write_operation: metadata}
+
+        return (json.dumps(action) + "\n" + json.dumps(source, allow_nan=False) + "\n").encode()
+
+    def batches(self, docs):
+        """Yields lists of encoded documents of about batch_size_bytes each."""
+        batch, batch_bytes = [], 0
+        for doc in docs:
+            encoded_doc = self.encode_doc(doc)
+            batch_size_bytes = self._controller.batch_size_bytes if self._controller else self.batch_size_bytes
+            if batch and batch_bytes + len(encoded_doc) > batch_size_bytes:
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(encoded_doc)
+            batch_bytes += len(encoded_doc)
+        if batch:
+            yield batch
+
+    def export_docs(self, docs):
+        """Exports an iterable of documents (dicts or hail Structs), returning once all of them are acknowledged."""
+        with ThreadPoolExecutor(max_workers=self._max_in_flight_requests_limit()) as executor:
+            for future in self._submit_batches(executor, docs, set()):
+                future.result()
+
+    def _submit_batches(self, executor, docs, in_flight):
+        """Submits the batches of docs to executor, waiting for requests of in_flight to complete while the maximum
+        number of requests is in flight. Stops submitting at the first failed request.
+
+        Returns:
+            list: futures of the submitted requests
+        """
+        futures = []
+        for batch in self.batches(docs):
+            while len(in_flight) >= (self._controller.max_in_flight_requests if self._controller else self.max_in_flight_requests):
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                in_flight.difference_update(done)
+                if any(future.exception() for future in done):
+                    return futures
+            future = executor.submit(self.send_batch, batch)
+            in_flight.add(future)
+            futures.append(future)
+        return futures
+
+    def export_table(self, table, progress=None):
+        """Exports the rows of a hail Table, sending each partition from the Spark executors.
+
+        The rows are first written as NDJSON with hl.json, one file per partition, by the hail executors. Each file is
+        then sent by its own Spark job, with up to `max_concurrent_partitions` jobs at a time, so every executor task
+        keeps up to `max_in_flight_requests` requests in flight like elasticsearch-hadoop does. The driver only
+        schedules the jobs and marks the partitions exported as their jobs complete.
+
+        Args:
+            table (Table): hail Table, its partitioning must be the same on every run if progress is given
+            progress (PartitionExportProgress): optional markers of the partitions already exported, these are skipped
+                and the partitions exported by this call are marked as they are acknowledged
+        """
+        n_partitions = table.n_partitions()
+        completed_partitions = progress.completed_partitions(n_partitions) if progress else set()
+        if completed_partitions:
+            logger.info(f"==> resuming export to {self._index_name}, skipping {len(completed_partitions)} of {n_partitions} partitions")
+        partitions = [i for i in range(n_partitions) if i not in completed_partitions]
+        if not partitions:
+            return
+
+        start = time.time()
+        docs_path = hl.utils.new_temp_file("es_bulk_export", "json")
+        operating_points = []
+        try:
+            part_paths = self._write_docs(table._filter_partitions(partitions) if completed_partitions else table, docs_path)
+            logger.info(f"==> wrote {len(part_paths)} partitions of documents in {time.time() - start:.0f}s")
+
+            sc = hl.spark_context()
+            export_id = uuid.uuid4().hex
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_partitions or sc.defaultParallelism) as executor:
+                futures = {
+                    executor.submit(self._export_part, sc, export_id, path): partition
+                    for partition, path in zip(partitions, part_paths)
+                }
+                try:
+                    for future in as_completed(futures):
+                        operating_points.extend(
+                            self._acknowledge_partition(futures[future], future, n_partitions, progress)
+                        )
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            if hl.hadoop_exists(docs_path):
+                hl.current_backend().fs.rmtree(docs_path)
+        logger.info(
+            f"==> bulk export to {self._index_name} done in {time.time() - start:.0f}s: {self.stats}"
+            f"{self._describe_operating_points(operating_points)}"
+        )
+
+    @staticmethod
+    def _write_docs(table, path):
+        """Writes the rows of table as one NDJSON file per partition, returning the files in partition order."""
+        table = table.select(doc=hl.json(_without_non_finite_floats(table.row))).key_by().select("doc")
+        table.export(path, header=False, parallel="separate_header")
+        return sorted(
+            (part["path"] for part in hl.hadoop_ls(path) if os.path.basename(part["path"]).startswith("part-")),
+            key=lambda part_path: int(os.path.basename(part_path).split("-")[1]),
+        )
+
+    def _export_part(self, sc, export_id, path):
+        """Runs a Spark job sending the documents of one partition file, returning the stats of its requests and the
+        controller operating points of its tasks."""
+        results = sc.textFile(path).mapPartitions(functools.partial(_export_lines, self, export_id)).collect()
+        stats = {key: sum(task_stats[key] for task_stats, _ in results) for key in self.stats}
+        return stats, [operating_point for _, operating_point in results if operating_point]
+
+    def _acknowledge_partition(self, partition, future, n_partitions, progress):
+        """Adds the stats of an exported partition and marks it exported, returning its operating points."""
+        try:
+            stats, operating_points = future.result()
+        except Exception as e:
+            raise ElasticsearchBulkExportError(f"Failed to export partition {partition} to {self._index_name}: {e}") from e
+        for key, value in stats.items():
+            self.stats[key] += value
+        if progress:
+            progress.mark_exported(partition)
+        logger.info(
+            f"==> exported partition {partition + 1} of {n_partitions} to {self._index_name}: {self.stats}"
+            f"{self._describe_operating_points(operating_points)}"
+        )
+        return operating_points
+
+    @staticmethod
+    def _describe_operating_points(operating_points):
+        """Median batch size and number of in-flight requests the controllers settled at, for the logs."""
+        if not operating_points:
+            return ""
+        batch_sizes = sorted(point["batch_size_bytes"] for point in operating_points)
+        in_flight = sorted(point["max_in_flight_requests"] for point in operating_points)
+        return (
+            f", controller at a median batch size of {batch_sizes[len(batch_sizes) // 2]} bytes"
+            f" (min {batch_sizes[0]}, max {batch_sizes[-1]}) and {in_flight[len(in_flight) // 2]} in-flight requests"
+            f" (min {in_flight[0]}, max {in_flight[-1]})"
+        )
+
+    def __getstate__(self):
+        # Sent to the executors, which create their own connection pool
+        state = dict(self.__dict__)
+        del state["_http"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._http = self._pool_manager()
+
+    def send_batch(self, batch):
+        """POSTs one batch of encoded documents, retrying rejected requests and documents."""
+        for attempt in range(self._max_retries + 1):
+            self._wait_for_backoff()
+            payload = b"".join(batch)
+            generation = self._controller.generation if self._controller else None
+            start = time.time()
+            response = self._http.request("POST", self._url, body=payload)
+            latency_seconds = time.time() - start
+            with self._lock:
+                self.stats["requests"] += 1
+
+            if response.status == TOO_MANY_REQUESTS:
+                self._on_rejected(generation, rejected_requests=1)
+                continue
+            if response.status >= 400:
+                raise ElasticsearchBulkExportError(
+                    f"_bulk request to {self._url} failed with status {response.status}: {response.data[:1000]}"
+                )
+
+            response_json = json.loads(response.data)
+            if self._use_took_latency and "took" in response_json:
+                latency_seconds = response_json["took"] / 1000
+            batch = self._failed_docs(batch, response_json)
+            with self._lock:
+                self.stats["bytes"] += len(payload)
+            if not batch:
+                self._on_accepted(latency_seconds)
+                return
+            self._on_rejected(generation, rejected_docs=len(batch))
+
+        raise ElasticsearchBulkExportError(
+            f"_bulk request to {self._url} still rejected after {self._max_retries} retries, {len(batch)} documents not exported"
+        )
+
+    def _failed_docs(self, batch, response):
+        """Counts the documents of a _bulk response and returns the ones that should be retried."""
+        retry_docs = []
+        n_failed = 0
+        for encoded_doc, item in zip(batch, response["items"] if response.get("errors") else []):
+            result = next(iter(item.values()))
+            if result.get("status") == TOO_MANY_REQUESTS:
+                retry_docs.append(encoded_doc)
+            elif result.get("error"):
+                n_failed += 1
+                if not self._ignore_write_errors:
+                    raise ElasticsearchBulkExportError(f"Failed to export document to {self._index_name}: {result['error']}")
+                logger.warning(f"Ignoring failed document in {self._index_name}: {result['error']}")
+        with self._lock:
+            self.stats["docs"] += len(batch) - len(retry_docs) - n_failed
+            self.stats["failed_docs"] += n_failed
+        return retry_docs
+
+    def _wait_for_backoff(self):
+        with self._lock:
+            backoff_seconds = self._backoff_seconds
+        if backoff_seconds:
+            time.sleep(backoff_seconds * random.uniform(0.5, 1))
+
+    def _max_in_flight_requests_limit(self):
+        return self._controller.max_in_flight_requests_limit if self._controller else self.max_in_flight_requests
+
+    def _on_rejected(self, generation, rejected_requests=0, rejected_docs=0):
+        if self._controller:
+            self._controller.on_rejected(generation)
+        with self._lock:
+            self.stats["rejected_requests"] += rejected_requests
+            self.stats["rejected_docs"] += rejected_docs
+            self._backoff_seconds = min(
+                self._max_backoff_seconds, max(self._initial_backoff_seconds, self._backoff_seconds * 2)
+            )
+            logger.info(f"==> _bulk request rejected by {self._index_name}, backing off {self._backoff_seconds:.1f}s")
+
+    def _on_accepted(self, latency_seconds):
+        if self._controller:
+            self._controller.on_accepted(latency_seconds)
+        with self._lock:
+            self._backoff_seconds /= 2
+            if self._backoff_seconds < self._initial_backoff_seconds:
+                self._backoff_seconds = 0
@@ -0,0 +1,325 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import hail as hl
+
+from hail_scripts.elasticsearch.elasticsearch_bulk_exporter import (
+    AimdBulkController,
+    ElasticsearchBulkExporter,
+    ElasticsearchBulkExportError,
+    PartitionExportProgress,
+)
+
+
+class StubElasticsearchServer(ThreadingHTTPServer):
+    """Records _bulk requests. Rejects the first `reject_requests` requests with a 429, and the first document of
+    each of the next `reject_docs` requests with an es_rejected_execution_exception. Requests with a document whose
+    idx is at least `fail_from_idx` fail with a 400.
+
+    With `capacity_bytes`, requests are also rejected with a 429 while more than that many bytes would be in flight,
+    and accepted requests take `latency_seconds_per_byte` to process, like a cluster with a fixed capacity. Responses
+    report a `took` time of `took_seconds_per_byte`, whether or not the request took that long."""
+
+    def __init__(self, reject_requests=0, reject_docs=0, fail_docs=0, fail_from_idx=None, capacity_bytes=None,
+                 latency_seconds_per_byte=0, took_seconds_per_byte=0):
+        super().__init__(("localhost", 0), StubElasticsearchHandler)
+        self.lock = threading.Lock()
+        self.requests = []
+        self.reject_requests = reject_requests
+        self.reject_docs = reject_docs
+        self.fail_docs = fail_docs
+        self.fail_from_idx = fail_from_idx
+        self.capacity_bytes = capacity_bytes
+        self.latency_seconds_per_byte = latency_seconds_per_byte
+        self.took_seconds_per_byte = took_seconds_per_byte
+        self.in_flight_bytes = 0
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def indexed_docs(self):
+        return [doc for request in self.requests if request["status"] == 200 for doc in request["indexed_docs"]]
+
+
+class StubElasticsearchHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode()
+        lines = body.splitlines()
+        actions = [(json.loads(action), json.loads(source)) for action, source in zip(lines[::2], lines[1::2])]
+
+        server = self.server
+        with server.lock:
+            over_capacity = server.capacity_bytes is not None and server.in_flight_bytes + len(body) > server.capacity_bytes
+            if not over_capacity:
+                server.in_flight_bytes += len(body)
+        if over_capacity:
+            with server.lock:
+                server.requests.append({"path": self.path, "bytes": len(body), "actions": actions, "status": 429})
+            self._respond(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+            return
+        try:
+            time.sleep(len(body) * server.latency_seconds_per_byte)
+            self._handle(server, body, actions)
+        finally:
+            with server.lock:
+                server.in_flight_bytes -= len(body)
+
+    def _handle(self, server, body, actions):
+        with server.lock:
+            request = {"path": self.path, "bytes": len(body), "actions": actions, "indexed_docs": []}
+            server.requests.append(request)
+            if server.reject_requests:
+                server.reject_requests -= 1
+                request["status"] = 429
+                self._respond(429, {"error": {"type": "es_rejected_execution_exception"}, "status": 429})
+                return
+            if server.fail_from_idx is not None and any(source.get("idx", -1) >= server.fail_from_idx for _, source in actions):
+                request["status"] = 400
+                self._respond(400, {"error": {"type": "illegal_argument_exception"}, "status": 400})
+                return
+
+            items = []
+            for i, (action, source) in enumerate(actions):
+                operation = next(iter(action))
+                if i == 0 and server.reject_docs:
+                    server.reject_docs -= 1
+                    items.append({operation: {"status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+                elif i == 0 and server.fail_docs:
+                    server.fail_docs -= 1
+                    items.append({operation: {"status": 400, "error": {"type": "mapper_parsing_exception"}}})
+                else:
+                    request["indexed_docs"].append((action, source))
+                    items.append({operation: {"status": 201}})
+            request["status"] = 200
+            self._respond(200, {
+                "took": round(len(body) * server.took_seconds_per_byte * 1000),
+                "errors": any("error" in next(iter(item.values())) for item in items),
+                "items": items,
+            })
+
+    def _respond(self, status, response):
+        data = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ElasticsearchBulkExporterTest(unittest.TestCase):
+
+    def _start_server(self, **kwargs):
+        server = StubElasticsearchServer(**kwargs)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _exporter(self, server, **kwargs):
+        return ElasticsearchBulkExporter(
+            "localhost", server.port, "test_index", elasticsearch_mapping_id="docId",
+            initial_backoff_seconds=0.01, max_backoff_seconds=0.05, **kwargs,
+        )
+
+    def _docs(self, n):
+        return [hl.Struct(docId=f"doc_{i}", pos=i, AF=0.5, filters=hl.utils.frozendict({}), missing=None) for i in range(n)]
+
+    def test_export_docs(self):
+        server = self._start_server()
+        exporter = self._exporter(server, batch_size_bytes=1000, max_in_flight_requests=3)
+        exporter.export_docs(self._docs(100))
+
+        self.assertEqual(exporter.stats["docs"], 100)
+        self.assertTrue(all(request["path"] == "/test_index/_bulk" for request in server.requests))
+        # batches are sized by bytes, so a batch only exceeds the limit if it is a single document
+        self.assertGreater(len(server.requests), 1)
+        self.assertTrue(all(request["bytes"] <= 1000 for request in server.requests))
+        action, source = next(
+            (action, source) for request in server.requests for action, source in request["actions"] if source["pos"] == 0
+        )
+        self.assertEqual(action, {"index": {"_id": "doc_0"}})
+        self.assertEqual(source, {"docId": "doc_0", "pos": 0, "AF": 0.5, "filters": {}})
+        self.assertCountEqual(
+            [source["docId"] for _, source in server.indexed_docs()], [f"doc_{i}" for i in range(100)],
+        )
+
+    def test_export_docs_upsert_null_values(self):
+        server = self._start_server()
+        exporter = self._exporter(server, elasticsearch_write_operation="upsert", write_null_values=True)
+        exporter.export_docs([hl.Struct(docId="doc_0", AF=float("nan"), missing=None)])
+
+        action, source = server.requests[0]["actions"][0]
+        self.assertEqual(action, {"update": {"_id": "doc_0"}})
+        self.assertEqual(source, {"doc": {"docId": "doc_0", "AF": None, "missing": None}, "doc_as_upsert": True})
+
+    def test_export_docs_retries_rejections(self):
+        server = self._start_server(reject_requests=3, reject_docs=2)
+        exporter = self._exporter(server, batch_size_bytes=1000, max_in_flight_requests=2)
+        exporter.export_docs(self._docs(50))
+
+        self.assertEqual(exporter.stats["docs"], 50)
+        self.assertEqual(exporter.stats["rejected_requests"], 3)
+        self.assertEqual(exporter.stats["rejected_docs"], 2)
+        self.assertCountEqual(
+            [source["docId"] for _, source in server.indexed_docs()], [f"doc_{i}" for i in range(50)],
+        )
+
+    def test_export_docs_gives_up(self):
+        server = self._start_server(reject_requests=100)
+        exporter = self._exporter(server, max_retries=2)
+        with self.assertRaises(ElasticsearchBulkExportError):
+            exporter.export_docs(self._docs(1))
+        self.assertEqual(len(server.requests), 3)
+
+    def test_export_docs_write_errors(self):
+        server = self._start_server(fail_docs=1)
+        with self.assertRaises(ElasticsearchBulkExportError):
+            self._exporter(server).export_docs(self._docs(5))
+
+        server = self._start_server(fail_docs=1)
+        exporter = self._exporter(server, ignore_elasticsearch_write_errors=True)
+        exporter.export_docs(self._docs(5))
+        self.assertEqual(exporter.stats["docs"], 4)
+        self.assertEqual(exporter.stats["failed_docs"], 1)
+
+    def test_aimd_controller_converges(self):
+        # Simulated cluster: requests of 20kB take the target latency, and requests over 60kB in flight are rejected.
+        controller = AimdBulkController(
+            batch_size_bytes=1000, max_in_flight_requests=1, min_batch_size_bytes=1000, max_batch_size_bytes=1_000_000,
+            max_in_flight_requests_limit=16, batch_size_increase_bytes=1000, target_latency_seconds=0.02,
+        )
+        statuses = []
+        for _ in range(300):
+            # Send a round of max_in_flight_requests concurrent requests
+            generation = controller.generation
+            batch_size_bytes = controller.batch_size_bytes
+            for i in range(controller.max_in_flight_requests):
+                if (i + 1) * batch_size_bytes > 60_000:
+                    controller.on_rejected(generation)
+                    statuses.append(429)
+                else:
+                    controller.on_accepted(batch_size_bytes * 1e-6)
+                    statuses.append(200)
+
+        self.assertIn(429, statuses)
+        # The batch size settles under the latency target instead of growing to the maximum,
+        self.assertGreater(controller.batch_size_bytes, 3_000)
+        self.assertLess(controller.batch_size_bytes, 40_000)
+        # and concurrency grows until about the cluster's capacity is in flight, without overloading it for long
+        in_flight_bytes = controller.batch_size_bytes * controller.max_in_flight_requests
+        self.assertGreater(in_flight_bytes, 15_000)
+        self.assertLess(in_flight_bytes, 240_000)
+        last_statuses = statuses[-len(statuses) // 4:]
+        self.assertLess(last_statuses.count(429), len(last_statuses) / 4)
+
+    def test_export_docs_aimd_controller_converges(self):
+        # Stub cluster reporting that requests of 20kB take the target latency, without taking it. One request at a
+        # time, so the controller sees the latencies in a deterministic order.
+        server = self._start_server(took_seconds_per_byte=5e-6)
+        controller = AimdBulkController(
+            batch_size_bytes=1000, max_in_flight_requests=1, min_batch_size_bytes=1000, max_batch_size_bytes=1_000_000,
+            max_in_flight_requests_limit=1, batch_size_increase_bytes=1000, target_latency_seconds=0.1,
+        )
+        exporter = self._exporter(server, controller=controller, use_took_latency=True)
+        exporter.export_docs(self._docs(15_000))
+
+        self.assertEqual(exporter.stats["docs"], 15_000)
+        request_bytes = [request["bytes"] for request in server.requests]
+        # Batches follow the controller's batch size, which grows until a request is over the latency target,
+        self.assertLess(request_bytes[0], 1_000)
+        first_slow_request = next(i for i, n_bytes in enumerate(request_bytes) if n_bytes > 20_100)
+        # then settles under it instead of growing to the maximum. The next batch is formed while a request is in
+        # flight, so a slow request can be followed by another one, and the batch size halved twice.
+        self.assertGreater(len(request_bytes), first_slow_request + 10)
+        for n_bytes in request_bytes[first_slow_request + 1:-1]:
+            self.assertGreater(n_bytes, 4_000)
+            self.assertLess(n_bytes, 23_000)
+        self.assertGreater(controller.batch_size_bytes, 4_000)
+        self.assertLess(controller.batch_size_bytes, 23_000)
+
+    def test_export_docs_aimd_controller_rejections(self):
+        # Stub cluster rejecting requests while over 60kB are in flight. Requests take their reported latency, so
+        # that they overlap, but the controller only sees the reported one.
+        server = self._start_server(capacity_bytes=60_000, latency_seconds_per_byte=5e-6, took_seconds_per_byte=5e-6)
+        controller = AimdBulkController(
+            batch_size_bytes=1000, max_in_flight_requests=1, min_batch_size_bytes=1000, max_batch_size_bytes=1_000_000,
+            max_in_flight_requests_limit=16, batch_size_increase_bytes=1000, target_latency_seconds=0.1,
+        )
+        exporter = self._exporter(server, controller=controller, use_took_latency=True)
+        exporter.export_docs(self._docs(15_000))
+
+        self.assertEqual(exporter.stats["docs"], 15_000)
+        self.assertCountEqual(
+            [source["docId"] for _, source in server.indexed_docs()], [f"doc_{i}" for i in range(15_000)],
+        )
+        self.assertIn(429, [request["status"] for request in server.requests])
+        # Each rejection reaches the controller with the generation it was sent at, and decreases it at most once
+        self.assertGreater(controller.generation, 0)
+        self.assertLessEqual(controller.generation, exporter.stats["rejected_requests"])
+
+    def test_aimd_controller(self):
+        controller = AimdBulkController(
+            batch_size_bytes=10_000, max_in_flight_requests=2, min_batch_size_bytes=1000, max_batch_size_bytes=12_000,
+            max_in_flight_requests_limit=3, batch_size_increase_bytes=1000, target_latency_seconds=1,
+        )
+        controller.on_accepted(0.5)
+        controller.on_accepted(0.5)
+        self.assertEqual(controller.operating_point(), {"batch_size_bytes": 12_000, "max_in_flight_requests": 3})
+        controller.on_accepted(0.5)
+        controller.on_accepted(0.5)
+        controller.on_accepted(0.5)
+        self.assertEqual(controller.operating_point(), {"batch_size_bytes": 12_000, "max_in_flight_requests": 3})
+
+        controller.on_accepted(2)
+        self.assertEqual(controller.batch_size_bytes, 6000)
+
+        # Only the first of several rejections of requests sent at the same operating point decreases it
+        generation = controller.generation
+        controller.on_rejected(generation)
+        controller.on_rejected(generation)
+        self.assertEqual(controller.operating_point(), {"batch_size_bytes": 3000, "max_in_flight_requests": 1})
+
+    def test_export_table_resume(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        progress = PartitionExportProgress(os.path.join(temp_dir, "_ES_EXPORT_PROGRESS", "test_index"))
+        table = hl.utils.range_table(50, n_partitions=5)
+        table = table.annotate(docId=hl.str(table.idx), AF=1 / table.idx)
+
+        # The first export fails on the fourth partition, partitions are sent one at a time so the first three are done
+        server = self._start_server(fail_from_idx=30)
+        exporter = self._exporter(server, max_concurrent_partitions=1)
+        with self.assertRaises(ElasticsearchBulkExportError):
+            exporter.export_table(table, progress=progress)
+        self.assertEqual(progress.completed_partitions(5), {0, 1, 2})
+        self.assertCountEqual([source["idx"] for _, source in server.indexed_docs()], list(range(30)))
+        self.assertEqual(exporter.stats["docs"], 30)
+        # Non-finite floats aren't written
+        sources = {source["idx"]: source for _, source in server.indexed_docs()}
+        self.assertEqual(sources[0], {"idx": 0, "docId": "0"})
+        self.assertEqual(sources[4], {"idx": 4, "docId": "4", "AF": 0.25})
+
+        # Resuming only sends the remaining partitions, the operating points of the workers' controllers are logged
+        server = self._start_server()
+        exporter = self._exporter(server, controller=AimdBulkController(batch_size_bytes=1000))
+        with self.assertLogs(level="INFO") as logs:
+            exporter.export_table(table, progress=progress)
+        self.assertIn("controller at a median batch size of", logs.output[-1])
+        self.assertCountEqual([source["idx"] for _, source in server.indexed_docs()], list(range(30, 50)))
+        self.assertEqual(exporter.stats["docs"], 20)
+        self.assertEqual(progress.completed_partitions(5), {0, 1, 2, 3, 4})
+
+        # Markers are discarded if the partitioning changed
+        self.assertEqual(progress.completed_partitions(10), set())
@@ -4,6 +4,7 @@ from pprint import pformat
 
 import hail as hl
 
+from hail_scripts.elasticsearch.elasticsearch_bulk_exporter import AimdBulkController, ElasticsearchBulkExporter
 from hail_scripts.elasticsearch.elasticsearch_client_v7 import ElasticsearchClient
 from hail_scripts.elasticsearch.elasticsearch_utils import (
     ELASTICSEARCH_INDEX,
@@ -17,6 +18,10 @@ from hail_scripts.elasticsearch.elasticsearch_utils import (
 
 logger = logging.getLogger()
 
+EXPORT_ENGINE_HADOOP = "hadoop"
+EXPORT_ENGINE_BULK = "bulk"
+EXPORT_ENGINES = (EXPORT_ENGINE_HADOOP, EXPORT_ENGINE_BULK)
+
 
 def struct_to_dict(struct):
     return {k: dict(struct_to_dict(v)) if isinstance(v, hl.utils.Struct) else v for k, v in struct.items()}
@@ -43,6 +48,11 @@ class HailElasticsearchClient(ElasticsearchClient):
         verbose=True,
         write_null_values=False,
         elasticsearch_config=None,
+        export_engine=EXPORT_ENGINE_HADOOP,
+        bulk_batch_size_bytes=5 * 1024 * 1024,
+        bulk_max_in_flight_requests=4,
+        bulk_adaptive=False,
+        bulk_export_progress=None,
     ):
         """Create a new elasticsearch index to store the records in this table, and then export all records to it.
 
@@ -92,7 +102,21 @@ class HailElasticsearchClient(ElasticsearchClient):
             verbose (bool): whether to print schema and stats
             write_null_values (bool): whether to write fields that are null to the index
             elasticsearch_config: The initial elasticsearch config from the caller
+            export_engine (string): EXPORT_ENGINE_HADOOP to export with hl.export_elasticsearch (elasticsearch-hadoop),
+                or EXPORT_ENGINE_BULK to send the table through the _bulk API from the Spark executors with
+                ElasticsearchBulkExporter.
+                block_size and elasticsearch_config only apply to EXPORT_ENGINE_HADOOP.
+            bulk_batch_size_bytes (int): EXPORT_ENGINE_BULK only, approximate size of each _bulk request body
+            bulk_max_in_flight_requests (int): EXPORT_ENGINE_BULK only, number of concurrent _bulk requests per partition
+            bulk_adaptive (bool): EXPORT_ENGINE_BULK only, start from bulk_batch_size_bytes and bulk_max_in_flight_requests
+                but tune them with an AimdBulkController from the observed latency and rejections
+            bulk_export_progress (PartitionExportProgress): EXPORT_ENGINE_BULK only, per-partition markers of the export.
+                Partitions already marked are skipped, so to resume an export also set delete_index_before_exporting=False.
         """
+        if export_engine not in EXPORT_ENGINES:
+            raise ValueError("Unexpected value for export_engine arg: " + str(export_engine))
+        if bulk_export_progress is not None and export_engine != EXPORT_ENGINE_BULK:
+            raise ValueError("bulk_export_progress is only supported by the bulk export engine")
 
         elasticsearch_config = elasticsearch_config or {}
         if (
@@ -183,15 +207,46 @@ class HailElasticsearchClient(ElasticsearchClient):
         if func_to_run_after_index_exists:
             func_to_run_after_index_exists()
 
-        logger.info(
-            "==> exporting data to elasticsearch. Write mode: %s, blocksize: %d",
-            elasticsearch_write_operation,
-            block_size,
-        )
+        if export_engine == EXPORT_ENGINE_BULK:
+            logger.info(
+                "==> exporting data to elasticsearch with the _bulk API. Write mode: %s, batch size: %d bytes, "
+                "in-flight requests: %d, adaptive: %s",
+                elasticsearch_write_operation,
+                bulk_batch_size_bytes,
+                bulk_max_in_flight_requests,
+                bulk_adaptive,
+            )
+            controller = None
+            if bulk_adaptive:
+                controller = AimdBulkController(
+                    batch_size_bytes=bulk_batch_size_bytes,
+                    max_in_flight_requests=bulk_max_in_flight_requests,
+                    max_in_flight_requests_limit=max(16, bulk_max_in_flight_requests),
+                )
+            ElasticsearchBulkExporter(
+                self._host,
+                self._port,
+                index_name,
+                es_username=self._es_username,
+                es_password=self._es_password,
+                batch_size_bytes=bulk_batch_size_bytes,
+                max_in_flight_requests=bulk_max_in_flight_requests,
+                elasticsearch_write_operation=elasticsearch_write_operation or ELASTICSEARCH_INDEX,
+                elasticsearch_mapping_id=elasticsearch_mapping_id,
+                write_null_values=write_null_values,
+                ignore_elasticsearch_write_errors=ignore_elasticsearch_write_errors,
+                controller=controller,
+            ).export_table(table, progress=bulk_export_progress)
+        else:
+            logger.info(
+                "==> exporting data to elasticsearch. Write mode: %s, blocksize: %d",
+                elasticsearch_write_operation,
+                block_size,
+            )
 
-        hl.export_elasticsearch(
-            table, self._host, int(self._port), index_name, index_type_name, block_size, elasticsearch_config, verbose
-        )
+            hl.export_elasticsearch(
+                table, self._host, int(self._port), index_name, index_type_name, block_size, elasticsearch_config, verbose
+            )
 
         """
         Potentially useful config settings for export_elasticsearch(..)
@@ -152,3 +152,53 @@ def update_existing_joined_hts(
         hl.any([~hl.is_missing(joined_ht[dataset]) for dataset in datasets]),
     )
     return update_joined_ht_globals(joined_ht)
+
+
+def flatten_interval_ht(ht: hl.Table) -> hl.Table:
+    """
+    Flattens an interval keyed table into sorted, non-overlapping segments between the breakpoints of its
+    intervals. Each segment lists in `matches` the rows of every interval covering it, so a locus is in at most
+    one segment and a lookup needs a single match instead of all overlapping intervals.
+    :param ht: table keyed by a locus interval, whose intervals may overlap
+    :return: table keyed by segment interval with a `matches` array of the rows of ht
+    """
+    reference_genome = ht.interval.dtype.point_type.reference_genome
+    # Half-open [start, end) breakpoints of each interval
+    breakpoints = ht.select(
+        breakpoints=[
+            hl.struct(
+                contig=ht.interval.start.contig,
+                position=ht.interval.start.position
+                + hl.int(~ht.interval.includes_start),
+            ),
+            hl.struct(
+                contig=ht.interval.end.contig,
+                position=ht.interval.end.position + hl.int(ht.interval.includes_end),
+            ),
+        ],
+    ).explode('breakpoints')
+    breakpoints = breakpoints.key_by(**breakpoints.breakpoints).select().distinct()
+    breakpoints = breakpoints.annotate(
+        previous=hl.scan._prev_nonnull(breakpoints.key),  # noqa: SLF001
+    )
+    segments = breakpoints.filter(
+        hl.is_defined(breakpoints.previous)
+        & (breakpoints.previous.contig == breakpoints.contig),
+    )
+    segments = segments.key_by(
+        interval=hl.locus_interval(
+            segments.contig,
+            segments.previous.position,
+            segments.position,
+            includes_start=True,
+            includes_end=False,
+            reference_genome=reference_genome,
+            invalid_missing=True,
+        ),
+    )
+    segments = segments.filter(hl.is_defined(segments.interval))
+    # Breakpoints include every interval bound, so the intervals covering a segment all contain its start
+    segments = segments.select(
+        matches=ht.index(segments.interval.start, all_matches=True),
+    )
+    return segments.filter(hl.len(segments.matches) > 0)
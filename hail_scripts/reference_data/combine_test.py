@@ -6,6 +6,7 @@ import hail as hl
 import pytz
 
 from hail_scripts.reference_data.combine import (
+    flatten_interval_ht,
     get_enum_select_fields,
     get_ht,
     update_existing_joined_hts,
@@ -348,3 +349,37 @@ class ReferenceDataCombineTest(unittest.TestCase):
                 ),
             ],
         )
+
+    def test_flatten_interval_ht(self):
+        def interval(contig, start, end, includes_end=False):
+            return hl.Interval(
+                hl.Locus(contig, start, 'GRCh38'),
+                hl.Locus(contig, end, 'GRCh38'),
+                includes_end=includes_end,
+            )
+
+        ht = hl.Table.parallelize(
+            [
+                {'interval': interval('chr1', 100, 200), 'score': 1},
+                {'interval': interval('chr1', 150, 300), 'score': 2},
+                {'interval': interval('chr2', 100, 200, includes_end=True), 'score': 3},
+            ],
+            hl.tstruct(
+                interval=hl.tinterval(hl.tlocus('GRCh38')),
+                score=hl.tint32,
+            ),
+            key='interval',
+        )
+        segments_ht = flatten_interval_ht(ht)
+        self.assertListEqual(
+            [
+                (str(row.interval), [m.score for m in row.matches])
+                for row in segments_ht.collect()
+            ],
+            [
+                ('[chr1:100-150)', [1]),
+                ('[chr1:150-200)', [1, 2]),
+                ('[chr1:200-300)', [2]),
+                ('[chr2:100-201)', [3]),
+            ],
+        )
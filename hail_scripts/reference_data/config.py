@@ -457,6 +457,8 @@ CONFIG = {
 CONFIG['dbnsfp_mito'] = {'38': deepcopy(CONFIG['dbnsfp']['38'])}
 CONFIG['dbnsfp_mito']['38']['filter'] = lambda ht: ht.locus.contig == 'chrM'
 
+# Relative to GCS_PREFIXES, read by download_and_create_reference_datasets/v03 scripts that run on dataproc
+COMBINED_REFERENCE_HT_PATH = 'reference_datasets/combined.ht'
 GCS_PREFIXES = {
     ('dev', AccessControl.PUBLIC): 'gs://seqr-scratch-temp/GRCh{genome_version}/v03',
     ('dev', AccessControl.PRIVATE): 'gs://seqr-scratch-temp/GRCh{genome_version}/v03',
@@ -0,0 +1,80 @@
+"""
+Compact variant sets, stored as sorted numpy arrays of variants encoded with get_expr_for_encoded_variant.
+
+Small reference variant sets (like the dataset validation tables) can be written next to their Hail table and
+loaded on the driver without reading the table, then checked with a literal set lookup per row instead of a join.
+"""
+import functools
+import io
+import os
+import re
+import tempfile
+
+import hail as hl
+import numpy as np
+
+from hail_scripts.computed_fields.variant_id import ALLELE_CODE_RANGE, get_expr_for_xpos, get_expr_for_encoded_variant
+
+# v2 encodes the alleles of non-SNVs with a 28 bit hash, files of the 6 bit allele code of v1 are ignored
+ENCODED_VARIANTS_SUFFIX = ".encoded.v2.npy"
+
+
+def encoded_variants_path(ht_path):
+    """Path of the encoded variants written next to the Hail table at ht_path."""
+    return re.sub(r"\.ht/?$", "", ht_path) + ENCODED_VARIANTS_SUFFIX
+
+
+def write_encoded_variants(ht, path):
+    """Write the sorted, unique encoded variants of a table keyed by locus and alleles to a .npy file.
+
+    :param ht: table with locus and alleles fields
+    :param path: output path
+    :return: number of encoded variants written
+    """
+    encoded = np.unique(np.array(get_expr_for_encoded_variant(ht.locus, ht.alleles).collect(), dtype=np.int64))
+    # np.save needs a real file, which hadoop streams are not
+    buffer = io.BytesIO()
+    np.save(buffer, encoded)
+    with hl.hadoop_open(path, "wb") as f:
+        f.write(buffer.getvalue())
+    return len(encoded)
+
+
+@functools.lru_cache()
+def read_encoded_variants(path):
+    """Memory-map the encoded variants at path, copying them to a local temp file first if they are remote.
+
+    :param path: path written by write_encoded_variants
+    :return: sorted int64 numpy array
+    """
+    if path.startswith("gs://"):
+        local_path = os.path.join(tempfile.mkdtemp(), os.path.basename(path))
+        hl.hadoop_copy(path, f"file://{local_path}")
+        path = local_path
+    return np.load(path, mmap_mode="r")
+
+
+def encoded_variants_in_intervals(encoded, intervals):
+    """Subset of sorted encoded variants within locus intervals.
+
+    :param encoded: sorted int64 numpy array
+    :param intervals: list of hl.Interval of loci
+    :return: sorted int64 numpy array
+    """
+    if not intervals:
+        return np.array([], dtype=np.int64)
+    bounds = hl.eval(hl.array([
+        hl.tuple([get_expr_for_xpos(hl.literal(interval.start)), get_expr_for_xpos(hl.literal(interval.end))])
+        for interval in intervals
+    ]))
+    subsets = []
+    for interval, (start, end) in zip(intervals, bounds):
+        # Inclusive xpos bounds
+        start = start if interval.includes_start else start + 1
+        end = end if interval.includes_end else end - 1
+        subsets.append(
+            encoded[
+                np.searchsorted(encoded, start * ALLELE_CODE_RANGE, "left"):
+                np.searchsorted(encoded, (end + 1) * ALLELE_CODE_RANGE - 1, "right")
+            ])
+    return np.unique(np.concatenate(subsets))
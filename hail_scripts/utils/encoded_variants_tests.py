@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import hail as hl
+
+from hail_scripts.computed_fields.variant_id import ALLELE_CODE_RANGE
+from hail_scripts.utils.encoded_variants import (
+    encoded_variants_in_intervals,
+    encoded_variants_path,
+    read_encoded_variants,
+    write_encoded_variants,
+)
+
+
+class EncodedVariantsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_encoded_variants_path(self):
+        self.assertEqual(
+            encoded_variants_path("gs://bucket/common_coding_variants.grch37.ht"),
+            "gs://bucket/common_coding_variants.grch37.encoded.v2.npy",
+        )
+        self.assertEqual(encoded_variants_path("validation.ht/"), "validation.encoded.v2.npy")
+
+    def test_write_and_read_encoded_variants(self):
+        ht = hl.Table.parallelize(
+            [
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "G"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "T"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "AT"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["AT", "A"]},
+                # Indels with the same length change and MNVs at the same position have their own codes
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "ACG"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "ATT"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["AC", "GT"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["AC", "TG"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "<DEL>"]},
+                {"locus": hl.Locus("1", 100), "alleles": ["A", "<DUP>"]},
+                {"locus": hl.Locus("2", 100), "alleles": ["A", "G"]},
+                {"locus": hl.Locus("X", 5000), "alleles": ["C", "T"]},
+            ],
+            hl.tstruct(locus=hl.tlocus("GRCh37"), alleles=hl.tarray(hl.tstr)),
+            key=["locus", "alleles"],
+        )
+        path = os.path.join(self.test_dir, "variants.encoded.npy")
+        self.assertEqual(write_encoded_variants(ht, path), 12)
+
+        encoded = read_encoded_variants(path)
+        self.assertEqual(list(encoded), sorted(encoded))
+        self.assertEqual(encoded[0] // ALLELE_CODE_RANGE, 1_000_000_100)
+        self.assertEqual(encoded[-1] // ALLELE_CODE_RANGE, 23_000_005_000)
+
+        intervals = [
+            hl.Interval(hl.Locus("1", 1), hl.Locus("1", 100), includes_end=True),
+            hl.Interval(hl.Locus("X", 4000), hl.Locus("X", 6000)),
+        ]
+        self.assertEqual(list(encoded_variants_in_intervals(encoded, intervals)), list(encoded[:10]) + [encoded[-1]])
+        self.assertEqual(len(encoded_variants_in_intervals(encoded, [])), 0)
+        # Excluded bounds are respected
+        intervals = [
+            hl.Interval(hl.Locus("1", 1), hl.Locus("1", 100), includes_end=False),
+            hl.Interval(hl.Locus("X", 5000), hl.Locus("X", 6000), includes_start=False),
+        ]
+        self.assertEqual(len(encoded_variants_in_intervals(encoded, intervals)), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,28 @@
 import hail as hl
+import json
 import logging
 
 from hail_scripts.computed_fields.variant_id import get_expr_for_variant_ids
 
 logger = logging.getLogger()
 
+DEFAULT_VEP_CONFIG_PATH = "file:///vep_data/vep-gcloud.json"
+# Wraps a VEP command to write "<start ns> <end ns> <exit status>" for each block to its own file in the directory
+# passed as $0, a local directory or a hadoop path written with `hadoop fs -put`. Failing to write it doesn't fail VEP.
+VEP_BLOCK_TIMER_COMMAND = [
+    "/bin/sh", "-c",
+    'start=$(date +%s%N); "$@"; status=$?; '
+    'line="$start $(date +%s%N) $status"; name="$(hostname)-$$-$start.txt"; '
+    'case "$0" in '
+    'file://*) dir="${0#file://}";; '
+    '*://*) dir="";; '
+    '*) dir="$0";; '
+    'esac; '
+    'if [ -n "$dir" ]; then { mkdir -p "$dir" && echo "$line" > "$dir/$name"; } 2>/dev/null; '
+    'else echo "$line" | hadoop fs -put - "$0/$name" >/dev/null 2>&1; fi; '
+    'exit $status',
+]
+
 
 def import_table(
         table_path: str,
@@ -110,18 +128,47 @@ def write_mt(mt_or_ht, output_path: str, overwrite: bool = True):
 write_ht = write_mt  # alias
 
 
+def write_vep_config(
+        config_path: str,
+        fork: int = 1,
+        block_latency_dir: str = None) -> str:
+    """Writes a copy of a hail VEP config running each VEP invocation with `fork` worker processes, and timing it.
+
+    :param str config_path: hail VEP config to copy
+    :param int fork: number of VEP worker processes per invocation (VEP's --fork option)
+    :param str block_latency_dir: directory, visible to the driver and to the machines running VEP, that each
+        invocation writes a file with its start and end times to
+    :return: path of the new config
+    """
+    with hl.hadoop_open(config_path, "r") as f:
+        config = json.load(f)
+    if fork > 1:
+        config["command"] = config["command"] + ["--fork", str(fork)]
+    if block_latency_dir:
+        config["command"] = VEP_BLOCK_TIMER_COMMAND + [block_latency_dir] + config["command"]
+    path = hl.utils.new_temp_file("vep_config", "json")
+    with hl.hadoop_open(path, "w") as f:
+        json.dump(config, f)
+    return path
+
+
 def run_vep(
         mt: hl.MatrixTable,
         genome_version: str,
         name: str = 'vep',
         block_size: int = 1000,
-        vep_config_json_path = None) -> hl.MatrixTable:
+        vep_config_json_path = None,
+        fork: int = 1,
+        block_latency_dir: str = None) -> hl.MatrixTable:
     """Runs VEP.
 
     :param MatrixTable mt: MT to annotate with VEP
     :param str genome_version: "37" or "38"
     :param str name: Name for resulting row field
     :param int block_size: Number of rows to process per VEP invocation.
+    :param int fork: Number of VEP worker processes per invocation.
+    :param str block_latency_dir: Directory that each VEP invocation writes a file with its start and end times to,
+        see `write_vep_config`.
     :return: annotated MT
     :rtype: MatrixTable
     """
@@ -131,7 +178,9 @@ def run_vep(
     else:
         if genome_version not in ["37", "38"]:
             raise ValueError(f"Invalid genome version: {genome_version}")
-        config = "file:///vep_data/vep-gcloud.json"
+        config = DEFAULT_VEP_CONFIG_PATH
+    if fork > 1 or block_latency_dir:
+        config = write_vep_config(config, fork=fork, block_latency_dir=block_latency_dir)
 
     mt = hl.vep(mt, config=config, name=name, block_size=block_size, tolerate_parse_error=True)
 
@@ -0,0 +1,64 @@
+"""
+Keys and post-processing of cached VEP annotations, shared by the loading pipeline's VEP cache
+(luigi_pipeline/lib/vep_cache.py) and the reference VEP table
+(download_and_create_reference_datasets/v03/write_reference_vep_ht.py).
+
+A cached table has a `cache_key` global, a hash of everything that changes VEP output (the VEP config file contents,
+the genome version and the VEP version), and the hashed fields in a `vep_cache_info` global.
+"""
+import hashlib
+import json
+import logging
+
+import hail as hl
+
+from hail_scripts.computed_fields import vep
+from hail_scripts.utils import hail_utils
+
+logger = logging.getLogger(__name__)
+
+# VEP releases of the hailctl dataproc VEP installs read by the default config, GENCODE 19 and 29.
+DEFAULT_VEP_VERSIONS = {"37": "85", "38": "95"}
+
+
+def vep_cache_info(genome_version, vep_config_json_path=None, vep_version=None):
+    """
+    Everything that changes VEP output, stored in the `vep_cache_info` global of the cache.
+    :param genome_version: "37" or "38"
+    :param vep_config_json_path: custom hail VEP config, or None for the default config
+    :param vep_version: VEP release of the config, e.g. "95". Defaults to DEFAULT_VEP_VERSIONS for the default
+        config, and to "unknown" for a custom config, which is then only identified by its contents.
+    :return: dict of the genome version, VEP version and hash of the VEP config contents
+    """
+    config_path = vep_config_json_path or hail_utils.DEFAULT_VEP_CONFIG_PATH
+    if vep_version is None:
+        vep_version = "unknown" if vep_config_json_path else DEFAULT_VEP_VERSIONS.get(genome_version, "unknown")
+    try:
+        with hl.hadoop_open(config_path, "r") as f:
+            config = f.read()
+    except Exception as e:
+        logger.warning(f"Unable to read VEP config {config_path}, keying VEP cache on the path only: {e}")
+        config = config_path
+    return {
+        "genome_version": genome_version,
+        "vep_version": vep_version,
+        "vep_config_sha256": hashlib.sha256(config.encode()).hexdigest(),
+    }
+
+
+def vep_cache_key(genome_version, vep_config_json_path=None, vep_version=None):
+    """
+    Hash identifying the VEP setup, used to invalidate the cache when the VEP config or VEP version changes. The
+    same config at another path has the same key.
+    :return: hex digest of `vep_cache_info`
+    """
+    info = vep_cache_info(genome_version, vep_config_json_path, vep_version)
+    return hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()
+
+
+def post_process_vep(ht):
+    """
+    Annotate a table of VEP results with their post-processed annotations, in the VEP_POST_PROCESSED_FIELD field.
+    """
+    ht = ht.annotate(**{vep.VEP_POST_PROCESSED_FIELD: vep.get_expr_for_vep_post_processed_struct(ht.vep)})
+    return ht.annotate_globals(post_processing_version=vep.VEP_POST_PROCESSING_VERSION)
@@ -0,0 +1,36 @@
+"""
+Stand-in for the VEP executable of a hail VEP config, for benchmarking VEP scheduling without a VEP installation.
+
+Reads a block of VCF lines on stdin and writes the fixture VEP JSON for each, with its `input` set to the line like
+VEP's. Sleeps --startup-seconds per invocation and --seconds-per-variant per variant to model VEP's cost, divided
+between the --fork worker processes like VEP's.
+
+    python3 benchmarks/fake_vep.py fixture.json --startup-seconds 1 --seconds-per-variant 0.001 < block.vcf
+"""
+
+import argparse
+import json
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('fixture_json')
+    parser.add_argument('--startup-seconds', type=float, default=0)
+    parser.add_argument('--seconds-per-variant', type=float, default=0)
+    parser.add_argument('--fork', type=int, default=1)
+    # Other VEP options of the config command, like the output format flag, are ignored.
+    args, _ = parser.parse_known_args()
+
+    with open(args.fixture_json) as f:
+        fixture = json.load(f)
+    time.sleep(args.startup_seconds)
+    lines = [line.rstrip('\n') for line in sys.stdin if not line.startswith('#')]
+    time.sleep(len(lines) * args.seconds_per_variant / args.fork)
+    for line in lines:
+        sys.stdout.write(json.dumps({**fixture, 'input': line}) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark of the single-pass genotype bucketing in SeqrGenotypesSchema against the
+previous implementation, which re-scanned the collected genotypes once per bucket.
+
+Run from the luigi_pipeline directory:
+
+    PYTHONPATH=.. python3 benchmarks/genotype_buckets.py --n-samples 10000 --n-variants 5000
+"""
+
+import argparse
+import time
+
+import hail as hl
+
+from luigi_pipeline.lib.model.base_mt_schema import row_annotation
+from luigi_pipeline.lib.model.seqr_mt_schema import SeqrGenotypesSchema
+
+
+class PerBucketFilterGenotypesSchema(SeqrGenotypesSchema):
+    """
+    The samples_* annotations as they were before bucketing: one filter over
+    `genotypes` per bucket.
+    """
+
+    @row_annotation(fn_require=SeqrGenotypesSchema.genotypes)
+    def samples_no_call(self):
+        return self._genotype_filter_samples(lambda g: g.num_alt == -1)
+
+    @row_annotation(fn_require=SeqrGenotypesSchema.genotypes)
+    def samples_num_alt(self, start=1, end=3, step=1):
+        return hl.struct(
+            **{
+                f'{i}': self._genotype_filter_samples(
+                    lambda g: g.num_alt == i,  # noqa: B023
+                )
+                for i in range(start, end, step)
+            },
+        )
+
+    @row_annotation(fn_require=SeqrGenotypesSchema.genotypes)
+    def samples_gq(self, start=0, end=95, step=5):
+        return hl.struct(
+            **{
+                f'{i}_to_{i + step}': self._genotype_filter_samples(
+                    lambda g: (g.gq >= i) & (g.gq < i + step),  # noqa: B023
+                )
+                for i in range(start, end, step)
+            },
+        )
+
+    @row_annotation(fn_require=SeqrGenotypesSchema.genotypes)
+    def samples_ab(self, start=0, end=45, step=5):
+        return hl.struct(
+            **{
+                f'{i}_to_{i + step}': self._genotype_filter_samples(
+                    lambda g: (g.num_alt == 1)
+                    & ((g.ab * 100) >= i)  # noqa: B023
+                    & ((g.ab * 100) < i + step),  # noqa: B023
+                )
+                for i in range(start, end, step)
+            },
+        )
+
+
+def synthetic_mt(n_samples, n_variants, n_partitions):
+    mt = hl.balding_nichols_model(
+        1,
+        n_samples,
+        n_variants,
+        n_partitions=n_partitions,
+    )
+    mt = mt.annotate_entries(dp=hl.rand_int32(10, 60))
+    mt = mt.annotate_entries(
+        GT=hl.or_missing(hl.rand_bool(0.98), mt.GT),
+        GQ=hl.rand_int32(0, 100),
+        AD=hl.bind(
+            lambda alt: [mt.dp - alt, alt],
+            hl.case()
+            .when(mt.GT.is_hom_ref(), 0)
+            .when(mt.GT.is_het(), hl.rand_int32(0, mt.dp))
+            .default(mt.dp),
+        ),
+    )
+    mt = mt.drop('dp')
+    return mt.checkpoint(hl.utils.new_temp_file('genotype_buckets', 'mt'))
+
+
+def time_schema(schema_class, mt):
+    start = time.time()
+    ht = schema_class(mt).annotate_all(overwrite=True).select_annotated_mt().rows()
+    ht.write(hl.utils.new_temp_file('genotype_buckets', 'ht'))
+    return time.time() - start
+
+
+def run(n_samples, n_variants, n_partitions):
+    mt = synthetic_mt(n_samples, n_variants, n_partitions)
+    for schema_class in [PerBucketFilterGenotypesSchema, SeqrGenotypesSchema]:
+        elapsed = time_schema(schema_class, mt)
+        print(
+            f'{schema_class.__name__}: {elapsed:.1f}s '
+            f'({n_variants / elapsed:.0f} rows/s, {n_samples} samples)',
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-samples', type=int, default=10000)
+    parser.add_argument('--n-variants', type=int, default=5000)
+    parser.add_argument('--n-partitions', type=int, default=8)
+    args = parser.parse_args()
+    run(args.n_samples, args.n_variants, args.n_partitions)
@@ -0,0 +1,163 @@
+"""
+Benchmark of reading the reference table restricted to the intervals of an exome-like callset
+(SeqrVCFToMTTask's ref_data_interval_bin_bp) against reading the whole table.
+
+The reference table is synthetic, with variants spread evenly over the autosomes. The callset clusters its
+variants in --n-targets targets of a few kb, like the exons of a gene panel or exome. Bytes read are the sizes of
+the reference partitions overlapping the intervals, from the partition bounds in the table metadata. The intervals
+cost an extra pass over the callset, which SeqrVCFToMTTask runs on its checkpointed callset, so it is timed
+separately on a checkpointed callset.
+
+Run from the luigi_pipeline directory:
+
+    PYTHONPATH=.. python3 benchmarks/ref_data_intervals.py --n-ref-rows 10000000 --n-targets 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import hail as hl
+
+from luigi_pipeline.seqr_loading import callset_intervals
+
+CONTIGS = [str(i) for i in range(1, 23)]
+TARGET_BP = 5000
+# Synthetic data only, seeded so runs are comparable.
+rng = random.Random(0)
+
+
+def synthetic_reference_ht(path, n_rows, n_partitions):
+    lengths = hl.get_reference('GRCh37').lengths
+    rows_per_contig = n_rows // len(CONTIGS)
+    spacing = hl.literal([lengths[contig] // rows_per_contig for contig in CONTIGS])
+    ht = hl.utils.range_table(rows_per_contig * len(CONTIGS), n_partitions=n_partitions)
+    # Rows are generated in key order, so keying doesn't shuffle
+    contig_index = hl.int32(ht.idx // rows_per_contig)
+    position = hl.int32((ht.idx % rows_per_contig) * spacing[contig_index] + 1)
+    ht = ht.key_by(
+        locus=hl.locus(
+            hl.literal(CONTIGS)[contig_index],
+            position,
+            reference_genome='GRCh37',
+        ),
+        alleles=['A', 'C'],
+    )
+    ht = ht.select(
+        cadd=hl.struct(PHRED=hl.rand_unif(0, 40)),
+        dbnsfp=hl.struct(score=hl.rand_unif(0, 1)),
+    )
+    ht.write(path, overwrite=True)
+
+
+def synthetic_callset(n_targets, n_variants_per_target):
+    lengths = hl.get_reference('GRCh37').lengths
+    loci = []
+    for _ in range(n_targets):
+        contig = rng.choice(CONTIGS)
+        start = rng.randint(1, lengths[contig] - TARGET_BP)
+        loci.extend(
+            (contig, start + rng.randrange(TARGET_BP))
+            for _ in range(n_variants_per_target)
+        )
+    mt = hl.utils.range_matrix_table(len(loci), 1)
+    loci = hl.literal([hl.Locus(*locus, reference_genome='GRCh37') for locus in loci])
+    locus = loci[mt.row_idx]
+    return mt.key_rows_by(locus=locus, alleles=hl.literal(['A', 'C']))
+
+
+def partition_bytes(path):
+    """
+    Bounds and size of each partition of the table at path.
+    """
+    # hadoop_open decompresses .gz files
+    with hl.hadoop_open(os.path.join(path, 'rows', 'metadata.json.gz')) as f:
+        metadata = json.load(f)
+    sizes = {
+        os.path.basename(f['path']): f['size_bytes']
+        for f in hl.hadoop_ls(os.path.join(path, 'rows', 'parts'))
+    }
+    return [
+        (bounds, sizes[part])
+        for bounds, part in zip(metadata['_jRangeBounds'], metadata['_partFiles'])
+    ]
+
+
+def bytes_read(partitions, intervals):
+    def position(contig, pos):
+        return CONTIGS.index(contig), pos
+
+    def overlaps(bounds, interval):
+        start = position(
+            bounds['start']['locus']['contig'],
+            bounds['start']['locus']['position'],
+        )
+        end = position(
+            bounds['end']['locus']['contig'],
+            bounds['end']['locus']['position'],
+        )
+        return (
+            position(interval.start.contig, interval.start.position) <= end
+            and position(interval.end.contig, interval.end.position) >= start
+        )
+
+    if intervals is None:
+        return sum(size for _, size in partitions)
+    return sum(
+        size
+        for bounds, size in partitions
+        if any(overlaps(bounds, interval) for interval in intervals)
+    )
+
+
+def time_join(mt, ref_path, intervals):
+    start = time.time()
+    ref = hl.read_table(ref_path)
+    if intervals is not None:
+        ref = hl.filter_intervals(ref, intervals)
+    annotated = mt.annotate_rows(cadd=ref[mt.row_key].cadd)
+    annotated.aggregate_rows(hl.agg.count_where(hl.is_defined(annotated.cadd)))
+    return time.time() - start
+
+
+def run(n_ref_rows, n_ref_partitions, n_targets, n_variants_per_target, bin_bp):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        ref_path = os.path.join(temp_dir, 'reference.ht')
+        synthetic_reference_ht(ref_path, n_ref_rows, n_ref_partitions)
+        mt = synthetic_callset(n_targets, n_variants_per_target)
+        mt = mt.checkpoint(os.path.join(temp_dir, 'callset.mt'))
+        partitions = partition_bytes(ref_path)
+
+        start = time.time()
+        intervals = callset_intervals(mt, bin_bp, '37')
+        print(
+            f'callset intervals pass: {len(intervals)} intervals in {time.time() - start:.1f}s',
+        )
+        for name, restriction in [
+            ('whole table', None),
+            (f'{len(intervals)} intervals', intervals),
+        ]:
+            elapsed = time_join(mt, ref_path, restriction)
+            print(
+                f'{name}: {bytes_read(partitions, restriction) / 1e6:.1f}MB read, join in {elapsed:.1f}s',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-ref-rows', type=int, default=10000000)
+    parser.add_argument('--n-ref-partitions', type=int, default=1000)
+    parser.add_argument('--n-targets', type=int, default=2000)
+    parser.add_argument('--n-variants-per-target', type=int, default=5)
+    parser.add_argument('--bin-bp', type=int, default=100000)
+    args = parser.parse_args()
+    run(
+        args.n_ref_rows,
+        args.n_ref_partitions,
+        args.n_targets,
+        args.n_variants_per_target,
+        args.bin_bp,
+    )
@@ -0,0 +1,81 @@
+"""
+Benchmark of the whole SeqrVCFToMTTask pipeline, VEP stage included, on a machine with no VEP install.
+
+Loads a synthetic callset with the STUB VEP runner, which runs VEP's JSON parse on variant specific annotations from
+lib/stub_vep.py, and with the DUMMY runner, which annotates every variant with the same struct. Also reports the
+mean JSON size of the annotated rows, a proxy for the size of the ES documents.
+
+The reference data tables are not synthesized, pass the paths of local copies. Run from the luigi_pipeline
+directory:
+
+    PYTHONPATH=.. python3 benchmarks/seqr_vcf_to_mt.py --reference-ht-path ref.ht --clinvar-ht-path clinvar.ht
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import hail as hl
+import luigi
+
+from luigi_pipeline.seqr_loading import SeqrVCFToMTTask
+
+
+def synthetic_vcf(path, n_samples, n_variants):
+    mt = hl.balding_nichols_model(3, n_samples, n_variants, reference_genome='GRCh37')
+    mt = mt.select_globals().select_cols().select_rows()
+    hl.export_vcf(mt, path)
+
+
+def time_load(vcf_path, dest_path, vep_runner, reference_ht_path, clinvar_ht_path):
+    start = time.time()
+    task = SeqrVCFToMTTask(
+        source_paths=[vcf_path],
+        dest_path=dest_path,
+        genome_version='37',
+        vep_runner=vep_runner,
+        reference_ht_path=reference_ht_path,
+        clinvar_ht_path=clinvar_ht_path,
+        sample_type='WES',
+        dont_validate=True,
+        grch38_to_grch37_ref_chain=None,
+    )
+    if not luigi.build([task], local_scheduler=True):
+        msg = f'SeqrVCFToMTTask failed with the {vep_runner} VEP runner'
+        raise RuntimeError(msg)
+    return time.time() - start
+
+
+def mean_row_json_bytes(mt_path):
+    rows = hl.read_matrix_table(mt_path).rows()
+    return rows.aggregate(hl.agg.mean(hl.len(hl.json(rows.row))))
+
+
+def run(n_samples, n_variants, reference_ht_path, clinvar_ht_path):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vcf_path = os.path.join(temp_dir, 'synthetic.vcf.bgz')
+        synthetic_vcf(vcf_path, n_samples, n_variants)
+        for vep_runner in ['DUMMY', 'STUB']:
+            dest_path = os.path.join(temp_dir, f'{vep_runner}.mt')
+            elapsed = time_load(
+                vcf_path,
+                dest_path,
+                vep_runner,
+                reference_ht_path,
+                clinvar_ht_path,
+            )
+            print(
+                f'{vep_runner}: {elapsed:.1f}s ({n_variants / elapsed:.0f} variants/s), '
+                f'{mean_row_json_bytes(dest_path):.0f} bytes of JSON per row',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-samples', type=int, default=100)
+    parser.add_argument('--n-variants', type=int, default=100000)
+    parser.add_argument('--reference-ht-path', required=True)
+    parser.add_argument('--clinvar-ht-path', required=True)
+    args = parser.parse_args()
+    run(args.n_samples, args.n_variants, args.reference_ht_path, args.clinvar_ht_path)
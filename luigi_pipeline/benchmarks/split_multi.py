@@ -0,0 +1,94 @@
+"""
+Benchmark of SeqrVCFToMTTask.split_multi_hts with and without split_multi_left_aligned,
+on a synthetic VCF with 90% biallelic and 10% multi-allelic rows.
+
+The synthetic rows are left aligned, as split_multi_left_aligned requires: multi-allelic rows have a SNP and an
+insertion after the reference base, so no split allele moves locus.
+
+Run from the luigi_pipeline directory:
+
+    PYTHONPATH=.. python3 benchmarks/split_multi.py --n-samples 100 --n-variants 200000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from unittest.mock import Mock
+
+import hail as hl
+
+from luigi_pipeline.seqr_loading import SeqrVCFToMTTask
+
+VCF_HEADER = """##fileformat=VCFv4.2
+##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">
+##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">
+##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">
+##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">
+##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Phred-scaled genotype likelihoods">
+##contig=<ID=1,length=249250621>
+"""
+BASES = 'ACGT'
+# Synthetic data only, seeded so runs are comparable.
+rng = random.Random(0)
+
+
+def _entry(n_alleles):
+    gt = sorted(rng.choices(range(n_alleles), weights=[8] + [1] * (n_alleles - 1), k=2))
+    ad = [rng.randint(0, 20) for _ in range(n_alleles)]
+    pl = [rng.randint(0, 500) for _ in range(n_alleles * (n_alleles + 1) // 2)]
+    pl[rng.randrange(len(pl))] = 0
+    return f'{gt[0]}/{gt[1]}:{",".join(map(str, ad))}:{sum(ad)}:{rng.randint(0, 99)}:{",".join(map(str, pl))}'
+
+
+def _alleles(multi_fraction):
+    ref = rng.choice(BASES)
+    alt = rng.choice(BASES.replace(ref, ''))
+    if rng.random() >= multi_fraction:
+        return ref, [alt]
+    return ref, [alt, ref + rng.choice(BASES)]
+
+
+def synthetic_vcf(path, n_samples, n_variants, multi_fraction):
+    with open(path, 'w') as f:
+        f.write(VCF_HEADER)
+        samples = '\t'.join(f'S{i}' for i in range(n_samples))
+        f.write(f'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{samples}\n')
+        for i in range(n_variants):
+            ref, alts = _alleles(multi_fraction)
+            entries = '\t'.join(_entry(len(alts) + 1) for _ in range(n_samples))
+            f.write(
+                f'1\t{(i + 1) * 10}\t.\t{ref}\t{",".join(alts)}\t.\tPASS\t.\tGT:AD:DP:GQ:PL\t{entries}\n',
+            )
+
+
+def time_split(vcf_path, n_partitions, left_aligned):
+    start = time.time()
+    mt = hl.import_vcf(vcf_path, min_partitions=n_partitions)
+    task = Mock(split_multi_left_aligned=left_aligned)
+    mt = SeqrVCFToMTTask.split_multi_hts(task, mt)
+    mt.write(hl.utils.new_temp_file('split_multi', 'mt'))
+    return time.time() - start
+
+
+def run(n_samples, n_variants, n_partitions, multi_fraction):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        vcf_path = os.path.join(temp_dir, 'synthetic.vcf')
+        synthetic_vcf(vcf_path, n_samples, n_variants, multi_fraction)
+        for left_aligned in [False, True]:
+            elapsed = time_split(vcf_path, n_partitions, left_aligned)
+            print(
+                f'split_multi_left_aligned={left_aligned}: {elapsed:.1f}s '
+                f'({n_variants / elapsed:.0f} input rows/s, {n_samples} samples)',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-samples', type=int, default=100)
+    parser.add_argument('--n-variants', type=int, default=200000)
+    parser.add_argument('--n-partitions', type=int, default=8)
+    parser.add_argument('--multi-fraction', type=float, default=0.1)
+    args = parser.parse_args()
+    run(args.n_samples, args.n_variants, args.n_partitions, args.multi_fraction)
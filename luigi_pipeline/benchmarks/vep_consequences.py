@@ -0,0 +1,58 @@
+"""
+Benchmark of get_expr_for_vep_sorted_transcript_consequences_array with and without encode_consequences,
+on the VEP annotation of the sample_vep.py test fixture replicated to --n-rows rows.
+
+Run from the luigi_pipeline directory:
+
+    PYTHONPATH=.. python3 benchmarks/vep_consequences.py --n-rows 1000000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import hail as hl
+
+from hail_scripts.computed_fields import vep
+
+from luigi_pipeline.tests.data.sample_vep import VEP_DATA
+
+
+def replicated_vep_ht(path, n_rows, n_partitions):
+    ht = hl.utils.range_table(n_rows, n_partitions=n_partitions)
+    ht = ht.annotate(vep=VEP_DATA['rs35471880']['vep'])
+    # Written so that the timings don't include building the input
+    ht.write(path, overwrite=True)
+
+
+def time_sorted_transcript_consequences(path, encode_consequences):
+    start = time.time()
+    ht = hl.read_table(path)
+    ht = ht.select(
+        sortedTranscriptConsequences=vep.get_expr_for_vep_sorted_transcript_consequences_array(
+            ht.vep,
+            encode_consequences=encode_consequences,
+        ),
+    )
+    ht.write(hl.utils.new_temp_file('vep_consequences', 'ht'))
+    return time.time() - start
+
+
+def run(n_rows, n_partitions):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'vep.ht')
+        replicated_vep_ht(path, n_rows, n_partitions)
+        for encode_consequences in [False, True]:
+            elapsed = time_sorted_transcript_consequences(path, encode_consequences)
+            print(
+                f'encode_consequences={encode_consequences}: {elapsed:.1f}s ({n_rows / elapsed:.0f} rows/s)',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-rows', type=int, default=1000000)
+    parser.add_argument('--n-partitions', type=int, default=8)
+    args = parser.parse_args()
+    run(args.n_rows, args.n_partitions)
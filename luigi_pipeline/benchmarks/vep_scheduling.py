@@ -0,0 +1,129 @@
+"""
+Benchmark of vep_scheduler.run_vep_in_tasks for combinations of block size, variants per task and VEP worker
+concurrency, on a synthetic dataset of a few large partitions.
+
+VEP is replaced by benchmarks/fake_vep.py, which echoes the VEP annotation of the sample_vep.py test fixture for
+each variant after sleeping to model VEP's startup and per-variant cost. The latency of each VEP block is recorded
+in a block latency directory.
+
+Run from the luigi_pipeline directory:
+
+    PYTHONPATH=.. python3 benchmarks/vep_scheduling.py --n-variants 100000 --n-partitions 2
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+
+import hail as hl
+
+from luigi_pipeline.lib import vep_scheduler
+from luigi_pipeline.tests.data.sample_vep import VEP_DATA
+
+FAKE_VEP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_vep.py')
+
+
+@dataclasses.dataclass
+class VEPSettings:
+    block_size: int
+    variants_per_task: int
+    concurrency: int
+
+
+# The first is the default of the pipeline.
+SETTINGS = [
+    VEPSettings(block_size=1000, variants_per_task=0, concurrency=1),
+    VEPSettings(block_size=1000, variants_per_task=5000, concurrency=1),
+    VEPSettings(block_size=5000, variants_per_task=5000, concurrency=1),
+    VEPSettings(block_size=5000, variants_per_task=5000, concurrency=4),
+    VEPSettings(block_size=500, variants_per_task=2000, concurrency=2),
+]
+
+
+def write_fake_vep_config(temp_dir, startup_seconds, seconds_per_variant):
+    vep_root = VEP_DATA['rs35471880']['vep']
+    fixture_path = os.path.join(temp_dir, 'fixture.json')
+    with open(fixture_path, 'w') as f:
+        f.write(hl.eval(hl.json(vep_root)))
+    config_path = os.path.join(temp_dir, 'fake_vep_config.json')
+    with open(config_path, 'w') as f:
+        json.dump(
+            {
+                'command': [
+                    sys.executable,
+                    FAKE_VEP_PATH,
+                    fixture_path,
+                    '--startup-seconds',
+                    str(startup_seconds),
+                    '--seconds-per-variant',
+                    str(seconds_per_variant),
+                    '__OUTPUT_FORMAT_FLAG__',
+                ],
+                'env': {},
+                'vep_json_schema': vep_root.dtype._parsable_string(),  # noqa: SLF001
+            },
+            f,
+        )
+    return config_path
+
+
+def synthetic_variants_ht(path, n_variants, n_partitions):
+    ht = hl.utils.range_table(n_variants, n_partitions=n_partitions)
+    ht = ht.key_by(
+        locus=hl.locus('1', ht.idx * 10 + 1, reference_genome='GRCh37'),
+        alleles=['A', 'C'],
+    )
+    ht.select().write(path, overwrite=True)
+
+
+def time_vep(variants_path, config_path, block_latency_dir, settings):
+    start = time.time()
+    ht = vep_scheduler.run_vep_in_tasks(
+        hl.read_table(variants_path),
+        '37',
+        vep_config_json_path=config_path,
+        block_latency_dir=block_latency_dir,
+        **dataclasses.asdict(settings),
+    )
+    ht.write(hl.utils.new_temp_file('vep_scheduling', 'ht'))
+    return time.time() - start
+
+
+def run(n_variants, n_partitions, startup_seconds, seconds_per_variant):
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_path = write_fake_vep_config(
+            temp_dir,
+            startup_seconds,
+            seconds_per_variant,
+        )
+        variants_path = os.path.join(temp_dir, 'variants.ht')
+        synthetic_variants_ht(variants_path, n_variants, n_partitions)
+        block_latency_dir = os.path.join(temp_dir, 'vep_block_latencies')
+        for settings in SETTINGS:
+            elapsed = time_vep(variants_path, config_path, block_latency_dir, settings)
+            latencies = vep_scheduler.read_vep_block_latencies(block_latency_dir)
+            print(
+                f'block_size={settings.block_size} variants_per_task={settings.variants_per_task} '
+                f'concurrency={settings.concurrency}: '
+                f'{elapsed:.1f}s ({n_variants / elapsed:.0f} variants/s), '
+                f'{vep_scheduler.summarize_vep_block_latencies(latencies)}',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n-variants', type=int, default=100000)
+    parser.add_argument('--n-partitions', type=int, default=2)
+    parser.add_argument('--startup-seconds', type=float, default=1)
+    parser.add_argument('--seconds-per-variant', type=float, default=0.0002)
+    args = parser.parse_args()
+    run(
+        args.n_variants,
+        args.n_partitions,
+        args.startup_seconds,
+        args.seconds_per_variant,
+    )